@@ -0,0 +1,88 @@
+"""
+Report memory used per datapoint and per language by `cldfviz.multiparameter.MultiParameter`.
+
+Usage:
+    python benchmarks/memory.py [--languages N] [--parameters N] [--codes N]
+
+A synthetic StructureDataset with one value per language and parameter is written to a temporary
+directory. Memory is measured with `tracemalloc`.
+"""
+import sys
+import random
+import argparse
+import tempfile
+import tracemalloc
+
+from pycldf import StructureDataset
+
+from cldfviz.multiparameter import MultiParameter, Language, Value
+from cldfviz.glottolog import Languoid
+
+
+def synthetic_dataset(d, nlangs, nparams, ncodes):
+    ds = StructureDataset.in_dir(d)
+    ds.add_component('LanguageTable')
+    ds.add_component('ParameterTable')
+    ds.add_component('CodeTable')
+    rnd = random.Random(42)
+    ds.write(
+        LanguageTable=[
+            dict(ID='l{}'.format(i),
+                 Name='Language {}'.format(i),
+                 Latitude=rnd.uniform(-60, 70),
+                 Longitude=rnd.uniform(-180, 180)) for i in range(nlangs)],
+        ParameterTable=[dict(ID='p{}'.format(i), Name='P {}'.format(i)) for i in range(nparams)],
+        CodeTable=[
+            dict(ID='p{}-{}'.format(i, j), Parameter_ID='p{}'.format(i), Name=str(j))
+            for i in range(nparams) for j in range(ncodes)],
+        ValueTable=[
+            dict(ID='l{}-p{}'.format(i, j),
+                 Language_ID='l{}'.format(i),
+                 Parameter_ID='p{}'.format(j),
+                 Code_ID='p{}-{}'.format(j, c),
+                 Value=str(c))
+            for i in range(nlangs) for j in range(nparams)
+            for c in [rnd.randrange(ncodes)]],
+    )
+    return ds
+
+
+def bytes_per_object(factory, n=10000):
+    tracemalloc.start()
+    snapshot = tracemalloc.take_snapshot()
+    objs = [factory(i) for i in range(n)]  # noqa: F841
+    size = sum(s.size_diff for s in tracemalloc.take_snapshot().compare_to(snapshot, 'filename'))
+    tracemalloc.stop()
+    # Discount the list holding the objects:
+    return (size - sys.getsizeof(objs)) / n
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as d:
+        ds = synthetic_dataset(d, args.languages, args.parameters, args.codes)
+        pids = ['p{}'.format(i) for i in range(args.parameters)]
+        tracemalloc.start()
+        mp = MultiParameter(ds, pids)
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    nvalues = len(mp.store)
+    print('MultiParameter for {} values of {} languages:'.format(nvalues, len(mp.languages)))
+    print('  retained: {:>10,} bytes ({:.1f} per value)'.format(size, size / nvalues))
+    print('  peak:     {:>10,} bytes ({:.1f} per value)'.format(peak, peak / nvalues))
+    print('  columns:  {:>10,} bytes'.format(sum(getattr(mp.store, name).nbytes for name in [
+        'lang', 'param', 'value', 'code', 'float', 'weight'])))
+    print('Bytes per object:')
+    for name, factory in [
+        ('Value', lambda i: Value(v=str(i), pid='p', lid='l', code='c')),
+        ('Language', lambda i: Language(dict(id=str(i), name='n', latitude=1, longitude=2))),
+        ('Languoid', lambda i: Languoid(id=str(i), name='n', lat=1.0, lon=2.0)),
+    ]:
+        print('  {:<10} {:.1f}'.format(name, bytes_per_object(factory)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--languages', type=int, default=2000)
+    parser.add_argument('--parameters', type=int, default=20)
+    parser.add_argument('--codes', type=int, default=4)
+    main(parser.parse_args())
@@ -0,0 +1,52 @@
+"""
+Report the time it takes to import cldfviz modules, and whether matplotlib gets imported.
+
+Usage:
+    python benchmarks/startup.py [--repeat N] [MODULE ...]
+
+Each import is timed in a fresh interpreter, thus the numbers include the cost of all
+dependencies - i.e. they approximate the startup overhead of the corresponding cldfviz command.
+"""
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+MODULES = [
+    'cldfviz.colormap',
+    'cldfviz.cli_util',
+    'cldfviz.commands.text',
+    'cldfviz.commands.network',
+    'cldfviz.commands.erd',
+    'cldfviz.commands.tree',
+    'cldfviz.commands.map',
+]
+SCRIPT = """
+import sys, json, time
+start = time.perf_counter()
+import {0}
+print(json.dumps([
+    time.perf_counter() - start,
+    'matplotlib' in sys.modules,
+    'matplotlib.pyplot' in sys.modules]))
+"""
+
+
+def time_import(module):
+    return json.loads(subprocess.check_output([sys.executable, '-c', SCRIPT.format(module)]))
+
+
+def main(args):
+    print('{:<28} {:>10} {:>11} {:>7}'.format('module', 'time [ms]', 'matplotlib', 'pyplot'))
+    for module in args.modules or MODULES:
+        res = [time_import(module) for _ in range(args.repeat)]
+        print('{:<28} {:>10.1f} {:>11} {:>7}'.format(
+            module, statistics.median(r[0] for r in res) * 1000, str(res[0][1]), str(res[0][2])))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('modules', nargs='*', metavar='MODULE')
+    main(parser.parse_args())
@@ -0,0 +1,100 @@
+"""
+Opt-in caching of data extracted from CLDF datasets across runs.
+
+Cached objects are stored as pickles in a user-specified directory, with file names derived from
+a fingerprint of everything the extracted data depends upon - typically the dataset (metadata and
+table files) and the relevant arguments.
+"""
+import json
+import pickle
+import typing
+import hashlib
+import pathlib
+import argparse
+
+import pycldf
+from csvw.utils import is_url
+from clldutils.clilib import PathType
+
+import cldfviz
+
+__all__ = ['fingerprint', 'cached', 'add_cache_dir']
+
+
+def _table_fingerprint(ds: pycldf.Dataset, table) -> list:
+    fname = table.url.resolve(table.base)
+    if is_url(fname):  # pragma: no cover
+        return [str(fname)]
+    fname = pathlib.Path(fname)
+    if not fname.exists():
+        fname = fname.parent / (fname.name + '.zip')
+    if fname.exists():
+        stat = fname.stat()
+        return [str(fname), stat.st_size, stat.st_mtime_ns]
+    return [str(fname)]  # pragma: no cover
+
+
+def _json(obj):
+    if isinstance(obj, pycldf.Dataset):
+        return dict(
+            metadata=obj.tablegroup.asdict(omit_defaults=True),
+            tables=[_table_fingerprint(obj, t) for t in obj.tables])
+    if callable(obj):
+        # Functions and classes - or instances of callable classes:
+        return '{}.{}'.format(obj.__module__, getattr(obj, '__qualname__', type(obj).__qualname__))
+    return str(obj)
+
+
+def fingerprint(*objs) -> str:
+    """
+    Compute a hash of `objs`.
+
+    Datasets are fingerprinted by their metadata and the size and modification time of their table
+    files, callables by their qualified name.
+    """
+    return hashlib.md5(
+        json.dumps(objs, default=_json, sort_keys=True).encode('utf8')).hexdigest()
+
+
+def cached(cache_dir: typing.Optional[pathlib.Path],
+           prefix: str,
+           factory: typing.Callable[[], typing.Any],
+           *key) -> typing.Any:
+    """
+    Return the object created by `factory` - possibly retrieved from the cache in `cache_dir`.
+
+    :param cache_dir: Cache directory. If `None`, `factory` is called unconditionally.
+    :param prefix: Name prefix for the cache file.
+    :param key: Objects to be passed into `fingerprint` to compute the cache key - together with \
+    the cldfviz version, because pickles depend on the class definitions.
+    """
+    if not cache_dir:
+        return factory()
+    p = pathlib.Path(cache_dir) / '{}-{}.pickle'.format(
+        prefix, fingerprint(cldfviz.__version__, *key))
+    if p.exists():
+        try:
+            with p.open('rb') as f:
+                return pickle.load(f)
+        except Exception:  # Truncated or otherwise unreadable pickle - treat as cache miss.
+            pass
+    res = factory()
+    pathlib.Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    tmp = p.parent / (p.name + '.tmp')
+    with tmp.open('wb') as f:
+        pickle.dump(res, f, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp.replace(p)
+    return res
+
+
+def add_cache_dir(parser):
+    try:
+        parser.add_argument(
+            '--cache-dir',
+            type=PathType(type='dir', must_exist=False),
+            help="Directory to cache data extracted from datasets across runs in. Cached data is "
+                 "invalidated when the dataset or the relevant options change.",
+            default=None,
+        )
+    except argparse.ArgumentError:  # pragma: no cover
+        pass  # cache-dir option already added.
@@ -8,6 +8,9 @@ import re
 import json
 import typing
 import inspect
+import functools
+import collections
+import collections.abc
 import pathlib
 import argparse
 import webbrowser
@@ -17,13 +20,15 @@ from clldutils.clilib import PathType, ParserError
 from clldutils import path
 import newick
 from pyglottolog.objects import Glottocode
-from pycldf import Dataset
-from pycldf.ext import discovery
+from pycldf import Dataset, orm
 from pycldf.trees import TreeTable, Tree
 
 from cldfviz.glottolog import Glottolog
-from cldfviz.colormap import COLORMAPS, CATEGORICAL, CONTINUOUS, Colormap
+from cldfviz.cache import cached, add_cache_dir
+from cldfviz.colormap import COLORMAPS, CATEGORICAL, Colormap
 from cldfviz.multiparameter import MultiParameter
+from cldfviz import dsutils
+from cldfviz.dsutils import iter_rows, read_tree
 
 
 def join_quoted(items: typing.Iterable) -> str:
@@ -82,36 +87,124 @@ def add_language_filter(parser):
     )
 
 
-def get_language_filter(args):
+class LanguageSelection(collections.abc.Set):
+    """
+    A set of language IDs, e.g. selected from a dataset by a `LanguageFilter`.
+
+    Membership tests are hash lookups and iteration follows the order in which IDs were added
+    (i.e. the order of the LanguageTable). Since a `LanguageSelection` contains raw ID strings, it
+    can also be passed as filter into `cldfviz.dsutils.iter_rows`.
+    """
+    def __init__(self, ids: typing.Iterable[str] = ()):
+        self._ids = list(dict.fromkeys(ids))
+        self.ids = frozenset(self._ids)
+
+    @classmethod
+    def _from_iterable(cls, it):
+        return cls(it)
+
+    def __contains__(self, lid):
+        return lid in self.ids
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __and__(self, other):
+        # Intersections keep the order of `self`.
+        other = other if isinstance(other, collections.abc.Set) else set(other)
+        return self._from_iterable(lid for lid in self._ids if lid in other)
+
+    __rand__ = __and__
+
+    def __repr__(self):
+        return '<{} of {} languages>'.format(self.__class__.__name__, len(self))
+
+
+class LanguageFilter:
+    """
+    A compiled `--language-filters` spec.
+
+    Regular expressions are compiled once, and selecting the matching languages of a dataset is
+    done column-wise, evaluating each condition only once per distinct value in a column.
+
+    A `LanguageFilter` can be called with `pycldf.orm.Language` objects or with row `dict`s keyed
+    by column name.
+    """
+    def __init__(self, spec: typing.Union[str, dict]):
+        self.spec = json.loads(spec) if isinstance(spec, str) else spec
+        self.conditions = [(col, self._compile(v)) for col, v in self.spec.items()]
+        self._selections = {}
+
+    @staticmethod
+    def _compile(v) -> typing.Callable[[typing.Any], bool]:
+        if isinstance(v, str):
+            regex = re.compile(v)
+
+            def test(val):
+                if isinstance(val, list):
+                    return v in val
+                return regex.search(str(val) or '') is not None
+            return test
+        return lambda val: val == v
+
+    def __call__(self, lg: typing.Union[dict, orm.Language]) -> bool:
+        data = lg if isinstance(lg, dict) else lg.data
+        return all(test(data[col]) for col, test in self.conditions)
+
+    def select(self, ds: Dataset) -> LanguageSelection:
+        """
+        The IDs of the languages in `ds` matching the filter (computed once per dataset).
+        """
+        if id(ds) not in self._selections:
+            if 'LanguageTable' not in ds:  # pragma: no cover
+                raise ValueError('Language filters only work on datasets with a LanguageTable')
+            cols = [col for col, _ in self.conditions]
+            ids, columns = [], collections.defaultdict(list)
+            for row in iter_rows(ds, 'LanguageTable', 'id', *cols):
+                ids.append(row['id'])
+                for col in cols:
+                    columns[col].append(row[col])
+            selected = None
+            for col, test in self.conditions:
+                # Evaluate the condition for each distinct value, then select the matching rows:
+                results, matching = {}, set()
+                for lid, val in zip(ids, columns[col]):
+                    key = tuple(val) if isinstance(val, list) else val
+                    if key not in results:
+                        results[key] = test(val)
+                    if results[key]:
+                        matching.add(lid)
+                selected = matching if selected is None else selected & matching
+            # We keep a reference to the dataset, to make sure its `id` isn't re-used:
+            self._selections[id(ds)] = (ds, LanguageSelection(
+                ids if selected is None else (lid for lid in ids if lid in selected)))
+        return self._selections[id(ds)][1]
+
+
+@functools.lru_cache(maxsize=None)
+def _language_filter(spec: str) -> LanguageFilter:
+    return LanguageFilter(spec)
+
+
+def get_language_filter(args) -> typing.Optional[LanguageFilter]:
+    """
+    The filter compiled from `args.language_filters` (shared between calls with the same spec).
+    """
     if args.language_filters is None:
         return
+    return _language_filter(args.language_filters)
 
-    def language_filter(lg):
-        for k, v in json.loads(args.language_filters).items():
-            val = lg.data[k]
-            if isinstance(v, str):
-                if isinstance(val, list):
-                    if v not in val:
-                        return False
-                elif not re.search(v, str(val) or ''):
-                    return False
-            else:
-                if lg.data[k] != v:
-                    return False
-        return True
-    return language_filter
-
-
-def get_filtered_languages(args, ds) -> typing.Union[None, typing.List[str]]:
+
+def get_filtered_languages(args, ds) -> typing.Optional[LanguageSelection]:
+    """
+    The languages in `ds` selected by `--language-filters` (or `None` if no filter is specified).
+    """
     language_filter = get_language_filter(args)
     if language_filter:
-        res = []
-        if 'LanguageTable' not in ds:  # pragma: no cover
-            raise ValueError('Language filters only work on datasets with a LanguageTable')
-        for lg in ds.objects('LanguageTable'):
-            if language_filter(lg):
-                res.append(lg.id)
-        return res
+        return language_filter.select(ds)
 
 
 def add_testable(parser):
@@ -139,12 +232,26 @@ def import_subclass(dotted_name_or_path, cls):
             return obj
 
 
+def add_jobs(parser):
+    try:
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            help="Number of processes to use for reading large tables of values.",
+            default=None,
+        )
+    except argparse.ArgumentError:  # pragma: no cover
+        pass  # jobs option already added.
+
+
 def add_multiparameter(parser, with_language_filter=False, with_language_properties=False):
     """
     Adds necessary options to instantiate a `MultiParameter` object (with related colormaps).
     """
     if with_language_filter:
         add_language_filter(parser)
+    add_cache_dir(parser)
+    add_jobs(parser)
     add_listvalued(
         parser,
         '--parameters',
@@ -159,8 +266,9 @@ def add_multiparameter(parser, with_language_filter=False, with_language_propert
         parser,
         '--colormaps',
         help="Comma-separated names of colormaps to use for the respective parameter. Choose from "
-             "{} for categorical and from {} for continuous parameters."
-             "".format(join_quoted(COLORMAPS[CATEGORICAL]), join_quoted(COLORMAPS[CONTINUOUS])),
+             "{} for categorical parameters and from the names of matplotlib colormaps "
+             "(see https://matplotlib.org/stable/gallery/color/colormap_reference.html) for "
+             "continuous parameters.".format(join_quoted(COLORMAPS[CATEGORICAL])),
     )
     parser.add_argument(
         '--missing-value',
@@ -170,6 +278,14 @@ def add_multiparameter(parser, with_language_filter=False, with_language_propert
              "value; so specifying --missing-value will **not** add null values for all languages "
              "in the dataset.)",
     )
+    parser.add_argument(
+        '--memory-budget',
+        help="Maximal memory (in MB) to use for holding values in memory. If more is needed, "
+             "values are spilled to temporary files on disk. (Note: --cache-dir is ignored if a "
+             "memory budget is specified.)",
+        type=int,
+        default=None,
+    )
     parser.add_argument(
         '--weight-col',
         help="Name of a column in ValueTable with numeric values to use as weight (for "
@@ -192,22 +308,53 @@ def add_multiparameter(parser, with_language_filter=False, with_language_propert
 
 
 def get_multiparameter(args, ds: Dataset, glottolog: Glottolog, **ukw):
+    """
+    :param glottolog: `Glottolog` instance or a callable accepting `args` and returning the \
+    `Glottolog` specified in `args` - e.g. `Glottolog.from_args`. The latter allows skipping \
+    loading Glottolog when the data can be retrieved from the cache.
+    """
     with_language_filters = hasattr(args, 'language_filters')
     with_language_properties = hasattr(args, 'language_properties')
 
     kw = dict(
         datatypes=args.datatypes,
-        glottolog=glottolog,
         include_missing=args.missing_value is not None,
         weight_col=getattr(args, 'weight_col', None),
     )
+    if getattr(args, 'jobs', None):
+        kw['jobs'] = args.jobs
+    if getattr(args, 'memory_budget', None):
+        kw['memory_budget'] = args.memory_budget * 1024 * 1024
     if with_language_properties:
         kw['language_properties'] = args.language_properties
     if with_language_filters:
         kw['language_filter'] = get_language_filter(args)
     kw.update(ukw)
 
-    data = MultiParameter(ds, args.parameters, **kw)
+    if callable(glottolog):
+        glottolog_key = Glottolog.cache_key_from_args(args)
+    else:
+        glottolog_key = getattr(glottolog, 'cache_key', None)
+
+    def make():
+        return MultiParameter(
+            ds,
+            args.parameters,
+            glottolog=glottolog(args) if callable(glottolog) else glottolog,
+            **kw)
+
+    data = cached(
+        # Spilled data cannot be cached:
+        None if kw.get('memory_budget') else getattr(args, 'cache_dir', None),
+        'multiparameter',
+        make,
+        ds,
+        args.parameters,
+        kw,
+        getattr(args, 'language_filters', None),
+        # The Glottolog data is identified by the same key as its persistent index:
+        glottolog_key,
+    )
 
     if args.parameters and not args.colormaps:
         args.colormaps = [None] * len(args.parameters)
@@ -287,9 +434,22 @@ def add_tree(parser):
     )
 
 
+def get_dataset(args: argparse.Namespace) -> Dataset:
+    """
+    Drop-in replacement for `pycldf.cli_util.get_dataset`, returning already loaded datasets.
+    """
+    try:
+        return dsutils.get_dataset(args.dataset, download_dir=args.download_dir)
+    except TypeError as e:  # pragma: no cover
+        if 'PathLike' in str(e):
+            raise ParserError(
+                'The dataset locator may require downloading, so you should specify --download-dir')
+        raise
+
+
 def get_secondary_dataset(args, opt: str):
     if getattr(args, opt):
-        return discovery.get_dataset(getattr(args, opt), args.download_dir)
+        return dsutils.get_dataset(getattr(args, opt), args.download_dir)
 
 
 def get_tree(args, glottolog: typing.Optional[Glottolog] = None) \
@@ -304,7 +464,9 @@ def get_tree(args, glottolog: typing.Optional[Glottolog] = None) \
     tree = None
     if args.tree:
         if Glottocode.pattern.match(args.tree):
-            assert glottolog
+            if glottolog is None:
+                glottolog = Glottolog.from_args(args)
+            assert glottolog is not None
             nwk = glottolog.newick(args.tree)
         elif pathlib.Path(args.tree).exists():
             nwk = newick.read(args.tree)[0]
@@ -314,7 +476,8 @@ def get_tree(args, glottolog: typing.Optional[Glottolog] = None) \
         for tree in TreeTable(ds):
             if (args.tree_id and tree.id == args.tree_id) or \
                     ((not args.tree_id) and tree.tree_type == 'summary'):
-                nwk = tree.newick()
+                # Only read and parse the selected tree from the tree file:
+                nwk = read_tree(tree)
                 break
         else:
             raise ValueError('No matching tree found')  # pragma: no cover
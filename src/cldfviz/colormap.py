@@ -1,20 +1,45 @@
 import json
+import math
 import typing
 import itertools
 import collections
+import collections.abc
 
-from matplotlib import cm
-from matplotlib.colors import Normalize, to_hex, CSS4_COLORS, BASE_COLORS
-import matplotlib.pyplot as plt
+import numpy as np
 from clldutils.color import qualitative_colors, sequential_colors, rgb_as_hex
 
 from cldfviz.multiparameter import CONTINUOUS, CATEGORICAL, Parameter
 
-__all__ = ['COLORMAPS', 'hextriplet', 'Colormap', 'get_shape_and_color', 'weighted_colors']
-COLORMAPS = {
-    CATEGORICAL: ['boynton', 'tol', 'base', 'seq'],
-    CONTINUOUS: [cm for cm in plt.colormaps() if not cm.endswith('_r')],
-}
+__all__ = [
+    'COLORMAPS', 'hextriplet', 'Colormap', 'get_shape_and_color', 'weighted_colors',
+    'MarkerCache', 'MARKER_CACHE']
+
+
+class ColormapRegistry(collections.abc.Mapping):
+    """
+    Names of the available colormaps per datatype.
+
+    Since importing matplotlib is slow, the continuous colormaps are read from
+    `matplotlib.colormaps` only when they are first requested.
+    """
+    def __init__(self):
+        self._names = {CATEGORICAL: ['boynton', 'tol', 'base', 'seq']}
+
+    def __getitem__(self, datatype):
+        if datatype == CONTINUOUS and CONTINUOUS not in self._names:
+            import matplotlib
+
+            self._names[CONTINUOUS] = [cm for cm in matplotlib.colormaps if not cm.endswith('_r')]
+        return self._names[datatype]
+
+    def __iter__(self):
+        return iter([CATEGORICAL, CONTINUOUS])
+
+    def __len__(self):
+        return 2
+
+
+COLORMAPS = ColormapRegistry()
 SHAPES = {
     'triangle_down',
     'triangle_up',
@@ -40,6 +65,8 @@ def hextriplet(s):
     if s in SHAPES:
         # A bit of a hack: We allow a handful of shape names as "color" spec as well.
         return s
+    from matplotlib.colors import CSS4_COLORS, BASE_COLORS
+
     if s in BASE_COLORS:
         return rgb_as_hex([float(d) for d in BASE_COLORS[s]])
     if s in CSS4_COLORS:
@@ -86,22 +113,30 @@ class Colormap:
                     key=lambda i: list(self.explicit_cm.keys()).index(i[0]))
             )
         self.novalue = hextriplet(novalue) if novalue else None
-        self._cm = getattr(cm, name or 'yyy', cm.jet)
+        self.name = name
 
         if isinstance(domain, tuple):
             assert not self.explicit_cm
-            # Initialize matplotlib colormap and normalizer:
-            norm = Normalize(domain[0], domain[1])
-            self.cm = lambda v: to_hex(self._cm(norm(float(v))))
+            from matplotlib.colors import to_hex
+
+            cmap = self.matplotlib_colormap()
+            # Matplotlib colormaps are lookup tables with `N` entries. So we can precompute the hex
+            # colors for all entries and map values to indices ourselves:
+            self.domain = domain
+            self.lut = [to_hex(c) for c in cmap(np.arange(cmap.N))]
+            self.bad = to_hex(cmap(np.nan))
+            self.cm = self._lookup
         else:
+            self.domain = None
             if self.explicit_cm:
-                self.cm = lambda v: self.explicit_cm[v]
+                self.lut = self.explicit_cm
             else:
                 if name == 'seq':
                     colors = sequential_colors(len(domain))
                 else:
                     colors = qualitative_colors(len(domain), set=name)
-                self.cm = lambda v: dict(zip(domain, colors))[v]
+                self.lut = dict(zip(domain, colors))
+            self.cm = self.lut.__getitem__
 
     @property
     def with_shapes(self):
@@ -109,14 +144,58 @@ class Colormap:
             c in SHAPES if isinstance(c, str) else c[0] in SHAPES for c in self.explicit_cm.values()
         )
 
+    def matplotlib_colormap(self):
+        import matplotlib
+
+        return matplotlib.colormaps.get(self.name or 'jet', matplotlib.colormaps['jet'])
+
     def scalar_mappable(self):
-        return cm.ScalarMappable(norm=None, cmap=self._cm)
+        from matplotlib import cm
+
+        return cm.ScalarMappable(norm=None, cmap=self.matplotlib_colormap())
 
     def __call__(self, value):
         if value is None:
             return self.novalue
         return self.cm(value)
 
+    def _index(self, normed):
+        # Same as `matplotlib.colors.Colormap.__call__` for values in [0, 1] - clipping the rest.
+        return min(max(int(normed * len(self.lut)), 0), len(self.lut) - 1)
+
+    def _lookup(self, v):
+        min_, max_ = self.domain
+        normed = (float(v) - min_) / (max_ - min_) if max_ > min_ else 0.0
+        return self.bad if math.isnan(normed) else self.lut[self._index(normed)]
+
+    def map_array(self, values: np.ndarray) -> np.ndarray:
+        """
+        Map an array of values to an array of colors.
+
+        :param values: Numbers for continuous parameters, codes otherwise. `None` values are \
+        mapped to the color for missing values.
+        """
+        values = np.asarray(values)
+        missing = np.equal(values, None) if values.dtype == object else \
+            np.zeros(values.shape, dtype=bool)
+        if self.domain is not None:
+            min_, max_ = self.domain
+            floats = np.where(missing, np.nan, values).astype(float)
+            normed = (floats - min_) / (max_ - min_) if max_ > min_ else floats * 0
+            bad = np.isnan(normed)
+            res = np.array(self.lut, dtype=object)[np.clip(
+                (np.where(bad, 0, normed) * len(self.lut)).astype(int), 0, len(self.lut) - 1)]
+            res[bad] = self.bad
+        else:
+            # Look up each distinct value only once:
+            _, first, inverse = np.unique(
+                values.astype(str), return_index=True, return_inverse=True)
+            res = np.array(
+                [None if v is None else self(v) for v in values[first].tolist()],
+                dtype=object)[inverse.reshape(-1)]
+        res[missing] = self.novalue
+        return res
+
 
 def get_shape_and_color(colors_or_shapes):
     if 1 <= len(colors_or_shapes) <= 2:
@@ -133,7 +212,62 @@ def get_shape_and_color(colors_or_shapes):
             return shapes[0], colors[0] if colors else '#000000'
 
 
-def weighted_colors(values, colormaps):
+def hashable(obj):
+    """
+    Turn (nested) lists - e.g. weighted colors with shapes - into tuples.
+    """
+    if isinstance(obj, (list, tuple)):
+        return tuple(hashable(o) for o in obj)
+    return obj
+
+
+CacheInfo = collections.namedtuple('CacheInfo', 'hits misses maxsize currsize')
+
+
+class MarkerCache:
+    """
+    A bounded LRU cache for objects derived from combinations of values, such as weighted colors
+    and rendered markers.
+
+    Since many languages typically share the same combination of values, computing markers only
+    once per distinct combination saves a lot of work.
+    """
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._data = collections.OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key, factory: typing.Callable[[], typing.Any]):
+        """
+        Return the object cached for `key` or create and cache it by calling `factory`.
+        """
+        try:
+            res = self._data[key]
+        except KeyError:
+            self.misses += 1
+            res = self._data[key] = factory()
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return res
+        except TypeError:  # Unhashable key.
+            self.misses += 1
+            return factory()
+        self.hits += 1
+        self._data.move_to_end(key)
+        return res
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+    def clear(self):
+        self._data.clear()
+        self.hits = self.misses = 0
+
+
+MARKER_CACHE = MarkerCache()
+
+
+def _weighted_colors(values, colormaps):
     colors = []
     for pid, vals in values.items():
         cm = colormaps[pid]
@@ -143,3 +277,19 @@ def weighted_colors(values, colormaps):
                 sum(1 if vv.weight is None else vv.weight for vv in vvs) / total / len(values),
                 cm(code)))
     return colors
+
+
+def weighted_colors(values, colormaps):
+    """
+    Compute the list of (weight, color) pairs for the values of a language.
+
+    Results are cached in `MARKER_CACHE`, keyed by the (colormap, value, weight) combination.
+    """
+    return MARKER_CACHE.get(
+        ('weighted_colors',) + tuple(
+            (pid, colormaps[pid], tuple(sorted(
+                ((vv.v, vv.weight) for vv in vals),
+                # Weights may be missing, i.e. `None`, for some of the values:
+                key=lambda t: (t[0], t[1] is None, t[1] or 0))))
+            for pid, vals in values.items()),
+        lambda: _weighted_colors(values, colormaps))
@@ -10,9 +10,9 @@ Assumes that
 from clldutils.clilib import PathType
 from clldutils.misc import nfilter
 from pycldf.terms import term_uri
-from pycldf.cli_util import get_dataset, add_dataset
+from pycldf.cli_util import add_dataset
 
-from cldfviz.cli_util import add_open, write_output, add_jinja_template
+from cldfviz.cli_util import add_open, write_output, add_jinja_template, get_dataset
 from cldfviz.media import get_objects_and_media, get_media_url
 from cldfviz.template import render_jinja_template, TEMPLATE_DIR
 
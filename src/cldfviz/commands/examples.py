@@ -1,12 +1,13 @@
 """
 Build an HTML file to display examples in a CLDF dataset.
 """
-from pycldf.cli_util import add_dataset, get_dataset
+from pycldf.cli_util import add_dataset
 from pycldf.sources import Sources
 from clldutils.misc import nfilter
 
 from cldfviz.cli_util import (
     add_open, write_output, add_jinja_template, add_language_filter, get_filtered_languages,
+    get_dataset,
 )
 from cldfviz.media import get_objects_and_media, get_media_url
 from cldfviz.template import render_jinja_template, TEMPLATE_DIR
@@ -19,12 +19,13 @@ Colors: Colors can be specified as
 """
 import pathlib
 
-from pycldf.cli_util import get_dataset, add_dataset
+from pycldf.cli_util import add_dataset
 from clldutils.clilib import PathType, ParserError
 
 from cldfviz.map import Map, MarkerFactory
 from cldfviz.cli_util import (
     add_testable, import_subclass, get_multiparameter, join_quoted, add_multiparameter,
+    get_dataset,
 )
 from cldfviz.glottolog import Glottolog
 
@@ -107,7 +108,7 @@ def run(args):
         assert args.output.suffix[1:] == args.format
 
     data, cms = get_multiparameter(
-        args, ds, Glottolog.from_args(args), exclude_lang=lambda lg: lg.lat is None)
+        args, ds, Glottolog.from_args, exclude_lang=lambda lg: lg.lat is None)
     if args.marker_factory:
         comps = args.marker_factory.split(',')
         cls = import_subclass(comps[0], MarkerFactory)
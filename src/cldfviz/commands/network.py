@@ -19,7 +19,9 @@ try:
 except ImportError:  # pragma: no cover
     Graph = None
 
-from pycldf.cli_util import get_dataset, add_dataset
+from pycldf.cli_util import add_dataset
+
+from cldfviz.cli_util import get_dataset
 
 
 def string_or_path(s):
@@ -12,13 +12,13 @@ import argparse
 
 from clldutils.clilib import PathType, ParserError
 from clldutils.markup import MarkdownImageLink
-from pycldf.ext import discovery
 from pycldf.ext.markdown import DatasetMapping
 from pycldf.media import MediaTable
 from termcolor import colored
 
 from cldfviz.text import iter_templates, render, iter_cldfviz_links
 from cldfviz.cli_util import add_testable
+from cldfviz import dsutils
 from . import map, tree
 
 
@@ -50,7 +50,7 @@ def register(parser):
 
 def run(args):
     dss = {
-        prefix: discovery.get_dataset(locator, args.download_dir)
+        prefix: dsutils.get_dataset(locator, args.download_dir)
         for prefix, locator in args.datasets}
 
     if args.list:
@@ -53,7 +53,8 @@ def register(parser):
 
 def run(args):
     cldf = get_secondary_dataset(args, 'data_dataset')
-    nwk, tree, treeds = get_tree(args, glottolog=Glottolog.from_args(args))
+    glottolog = Glottolog.from_args(args)
+    nwk, tree, treeds = get_tree(args, glottolog=glottolog)
 
     if args.ascii_art:
         print(nwk.ascii_art())
@@ -76,9 +77,6 @@ def run(args):
         if tree and tree.tree_branch_length_unit:
             legend += ' with branches in {}'.format(tree.tree_branch_length_unit)
 
-    glangs = {}
-    if args.glottolog and args.glottolog_links:  # pragma: no cover
-        glangs = {lg.id: lg.name for lg in args.glottolog.api.languoids()}
     if pathlib.Path(args.styles).exists():
         args.styles = pathlib.Path(args.styles).read_text(encoding='utf8')
     lf = get_language_filter(args)
@@ -122,11 +120,17 @@ def run(args):
         labels=labels or None,
     )
     if treeds:
+        gcs = {
+            r['id']: r['glottocode'] for r in treeds.iter_rows('LanguageTable', 'id', 'glottocode')
+            if r['glottocode']}
+        glangs = {}
+        if args.glottolog_links and glottolog is not None:
+            # Look up the names of the Glottolog languoids for the link titles:
+            glottolog.prefetch(gcs.values())
+            glangs = {gc: glottolog[gc].name for gc in gcs.values() if gc in glottolog}
         kw.update(
             tree_object=tree,
-            glottolog_mapping={
-                r['id']: (r['glottocode'], glangs.get(r['glottocode']) or '') for r in
-                treeds.iter_rows('LanguageTable', 'id', 'glottocode') if r['glottocode']},
-            leafs=[lg.id for lg in treeds.objects('LanguageTable') if lf(lg)] if lf else None,
+            glottolog_mapping={lid: (gc, glangs.get(gc) or '') for lid, gc in gcs.items()},
+            leafs=list(lf.select(treeds)) if lf else None,
         )
     write_output(args, render(nwk, **kw))
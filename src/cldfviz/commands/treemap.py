@@ -26,12 +26,14 @@ import logging
 import pathlib
 import collections
 
-from pycldf.cli_util import add_dataset, get_dataset
+from pycldf.cli_util import add_dataset
 
 from cldfviz.cli_util import (
     add_testable, add_open, open_output, add_language_filter, get_filtered_languages,
-    add_tree, get_tree,
+    add_tree, get_tree, add_jobs,
+    get_dataset,
 )
+from cldfviz.dsutils import iter_rows
 from cldfviz.glottolog import Glottolog
 from cldfviz.pdutils import df_from_dicts
 
@@ -77,6 +79,7 @@ def register(parser):
         help="Name of the language property used to identify languages in the tree.",
         default='glottocode')
     add_language_filter(parser)
+    add_jobs(parser)
     for opt, default, help in iter_ltm_options():
         parser.add_argument(
             '--ltm-{}'.format(opt.replace('_', '-')),
@@ -102,11 +105,13 @@ def run(args):
     cols = ['parameterReference', 'languageReference', 'value']
     if ds.get(('ValueTable', 'codeReference')):
         cols.append('codeReference')
+    filters = {'parameterReference': {args.parameter}}
+    if filtered_languages is not None:
+        filters['languageReference'] = filtered_languages
     values = {
-        v['languageReference']: v for v in ds.iter_rows('ValueTable', *cols)
-        if v['parameterReference'] == args.parameter and  # noqa: W504
-        v['value'] and  # noqa: W504  We don't handle missing data
-        (filtered_languages is None or (v['languageReference'] in filtered_languages))}
+        v['languageReference']: v
+        for v in iter_rows(ds, 'ValueTable', *cols, filters=filters, jobs=args.jobs)
+        if v['value']}  # We don't handle missing data
 
     # 2. Get the tree ...
     tree, _, _ = get_tree(args, glottolog=glottolog)
@@ -126,7 +131,8 @@ def run(args):
                     languages[lang['id']] = lang
                     treelabel2id[treelabel] = lang['id']
     else:
-        assert glottolog
+        assert glottolog is not None
+        glottolog.prefetch(lid for lid in values if lid in nodes)
         for lid in values:
             if lid in nodes:
                 glang = glottolog[lid]
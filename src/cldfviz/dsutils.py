@@ -0,0 +1,316 @@
+"""
+Utilities to read data from CLDF datasets more efficiently than with `pycldf.Dataset.iter_rows`.
+"""
+import io
+import re
+import json
+import mmap
+import codecs
+import typing
+import pathlib
+import collections
+import concurrent.futures
+
+import csvw
+import pycldf
+import newick
+from csvw.dsv import UnicodeReader
+from csvw.utils import is_url
+from commonnexus import Nexus
+from pycldf.ext import discovery
+
+__all__ = [
+    'get_dataset', 'iter_rows', 'existing_columns', 'row_boundaries', 'tree_offsets', 'read_tree']
+
+TREE_INDEX = '.cldfviz-trees.json'
+_tree_indexes = {}
+# Registry of loaded datasets, keyed by resolved metadata path, and of resolved locators:
+_datasets = {}
+_locators = {}
+# Approximate size in bytes of the chunks of a file read by one worker process in `iter_rows`:
+CHUNK_SIZE = 2 ** 22
+
+
+def _metadata_key(ds: pycldf.Dataset) -> typing.Optional[typing.Tuple[str, list]]:
+    fname = getattr(ds.tablegroup, '_fname', None)
+    if fname and not is_url(fname) and pathlib.Path(fname).is_file():
+        stat = pathlib.Path(fname).stat()
+        return str(pathlib.Path(fname).resolve()), [stat.st_size, stat.st_mtime_ns]
+    return None
+
+
+def get_dataset(locator: str,
+                download_dir: typing.Optional[pathlib.Path] = None) -> pycldf.Dataset:
+    """
+    Return the dataset specified by `locator`, see `pycldf.ext.discovery.get_dataset`.
+
+    Datasets are loaded only once per process: They are registered by the resolved path and the
+    modification time of their metadata file, and a registered dataset is returned - together with
+    data cached on it, like ORM objects - as long as its metadata file did not change.
+    """
+    lkey = (str(locator), str(download_dir))
+    if lkey in _locators:
+        path = _locators[lkey]
+        ds, key = _datasets[path]
+        if _metadata_key(ds) == (path, key):
+            return ds
+    ds = discovery.get_dataset(locator, download_dir)
+    mkey = _metadata_key(ds)
+    if mkey is None:  # E.g. metadata-free datasets.
+        return ds
+    path, key = mkey
+    if path in _datasets and _datasets[path][1] == key:
+        # Another locator resolved to the same, unchanged dataset.
+        ds = _datasets[path][0]
+    _datasets[path] = (ds, key)
+    _locators[lkey] = path
+    return ds
+
+
+def existing_columns(ds: pycldf.Dataset, table: str, *cols: str) -> typing.List[str]:
+    """
+    Filter `cols`, keeping the ones which can be resolved in `table`.
+    """
+    return [col for col in cols if ds.get((table, col))]
+
+
+def _filtered(reader, filters, cols) -> typing.Generator[tuple, None, None]:
+    for row in reader:
+        if all(j < len(row) and row[j] in v for j, v in filters):
+            yield tuple(
+                col.read(row[j] if j is not None and j < len(row) else '') for _, col, j in cols)
+
+
+def _as_dicts(rows, keys) -> typing.Generator[dict, None, None]:
+    for row in rows:
+        res = {}
+        for (spec, name), value in zip(keys, row):
+            res[spec] = res[name] = value
+        yield res
+
+
+def _read_chunk(metadata, table, fname, start, end, filters, cols) -> typing.List[tuple]:
+    """
+    Read the rows in the byte range [start, end) of a DSV file - in a worker process.
+
+    Since csvw objects cannot be pickled reliably, the table is re-created from its metadata.
+    """
+    t = csvw.TableGroup.fromvalue(metadata).tables[table]
+    cols = [(spec, t.tableSchema.get_column(name), j) for spec, name, j in cols]
+    with open(fname, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8-sig' if start == 0 else 'utf-8')
+    with UnicodeReader(io.StringIO(text, newline=''), dialect=t._get_dialect()) as reader:
+        return list(_filtered(reader, filters, cols))
+
+
+def row_boundaries(fname, n: int, quotechar: str = '"') -> typing.List[int]:
+    """
+    Split a DSV file with a one-line header into (at most) `n` byte ranges of data rows.
+
+    Ranges end at line breaks which are not within quoted cells, i.e. where the number of quote
+    characters before is even.
+
+    :return: List of byte offsets, starting with the offset of the first data row and ending \
+    with the file size.
+    """
+    quotechar = quotechar.encode('utf8')
+    with open(fname, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size, res, quotes, pos = len(mm), [], 0, 0
+        for target in [0] + [size * k // n for k in range(1, n)]:
+            if target < pos:
+                continue
+            # Find the next line break outside of quotes:
+            while True:
+                nl = mm.find(b'\n', max(target, pos))
+                if nl == -1:
+                    nl = size - 1
+                quotes += mm[pos:nl + 1].count(quotechar)
+                pos = nl + 1
+                if quotes % 2 == 0 or pos >= size:
+                    break
+                target = pos
+            if pos >= size:
+                break
+            res.append(pos)
+        return res + [size]
+
+
+def iter_rows(ds: pycldf.Dataset,
+              table: str,
+              *cols: str,
+              filters: typing.Optional[typing.Dict[str, typing.Container[str]]] = None,
+              jobs: typing.Optional[int] = None) \
+        -> typing.Generator[dict, None, None]:
+    """
+    Iterate over rows of a table, reading only the specified columns.
+
+    Rows are filtered **before** the cells are converted to Python objects according to their
+    datatype, thus rows not matching `filters` cost hardly more than reading a line of the file.
+
+    :param cols: CLDF property terms or column names. The row dicts have the converted values \
+    keyed with column names as well as with the spec passed in `cols`.
+    :param filters: Mapping of CLDF property terms or column names to containers of admissible \
+    (raw, i.e. `str`) cell values.
+    :param jobs: Number of worker processes to use for reading (UTF-8 encoded files with one \
+    header row). The file is split into byte ranges of rows of about `CHUNK_SIZE` bytes, which \
+    are read in parallel. Rows are yielded in the order of the file. At most `2 * jobs` ranges \
+    are read ahead, so memory use does not grow with the size of the file.
+    """
+    t = ds[table]
+    filters = [(ds[table, k], v) for k, v in (filters or {}).items()]
+    cols = [(spec, ds[table, spec]) for spec in cols]
+    fname = t.url.resolve(t.base)
+    if is_url(fname) or not pathlib.Path(fname).exists():
+        # We let csvw deal with remote or zipped data.
+        for row in ds[table]:
+            if all(str(row[col.name]) in v for col, v in filters):
+                res = {col.name: row[col.name] for _, col in cols}
+                res.update({spec: row[col.name] for spec, col in cols})
+                yield res
+        return
+
+    dialect = t._get_dialect()
+    with UnicodeReader(fname, dialect=dialect) as reader:
+        reader = iter(reader)
+        if dialect.header:
+            header = next(reader, None)
+            if header is None:  # pragma: no cover
+                return
+        else:  # pragma: no cover
+            header = [c.header for c in t.tableSchema.columns if not c.virtual]
+        index = {}
+        for i, h in enumerate(header):
+            col = t.tableSchema.get_column(h)
+            if col is not None:
+                index[id(col)] = i
+        if any(id(col) not in index for col, _ in filters):  # pragma: no cover
+            return  # No row can match a filter on a column which isn't in the data.
+        filters = [(index[id(col)], v) for col, v in filters]
+        keys = [(spec, col.name) for spec, col in cols]
+        cols = [(spec, col, index.get(id(col))) for spec, col in cols]
+        if jobs and jobs > 1 and dialect.header and dialect.headerRowCount == 1 \
+                and not dialect.skipRows and not dialect.commentPrefix \
+                and dialect.python_encoding.replace('-', '').startswith('utf8'):
+            bounds = row_boundaries(
+                fname,
+                max(4 * jobs, pathlib.Path(fname).stat().st_size // CHUNK_SIZE),
+                quotechar=dialect.quoteChar or '"')
+            metadata = ds.tablegroup.asdict(omit_defaults=True)
+            table_index = [i for i, tt in enumerate(ds.tables) if tt is t][0]
+            cols = [(spec, col.name, j) for spec, col, j in cols]
+            with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+                pending = collections.deque()
+                for start, end in zip(bounds, bounds[1:]):
+                    if len(pending) == 2 * jobs:
+                        yield from _as_dicts(pending.popleft().result(), keys)
+                    pending.append(executor.submit(
+                        _read_chunk, metadata, table_index, str(fname), start, end, filters, cols))
+                while pending:
+                    yield from _as_dicts(pending.popleft().result(), keys)
+            return
+        yield from _as_dicts(_filtered(reader, filters, cols), keys)
+
+
+def _newick_offsets(mm) -> typing.Dict[str, typing.Tuple[int, int]]:
+    # Trees in Newick files are numbered, in the same way as in `pycldf.trees.Tree`.
+    res, start = {}, 0
+    while start < len(mm):
+        end = mm.find(b';', start)
+        if end == -1:
+            end = len(mm)
+        if mm[start:end].strip():
+            res[str(len(res) + 1)] = (start, end)
+        start = end + 1
+    return res
+
+
+NEXUS_TREE = re.compile(
+    rb"\s*(?:\[[^\]]*]\s*)*tree\s+('(?:[^']|'')+'|[^\s=]+)", flags=re.IGNORECASE)
+
+
+def _nexus_offsets(mm) -> typing.Dict[str, typing.Tuple[int, int]]:
+    # We find the (byte ranges of the) commands of a Nexus file, i.e. text terminated by ";"
+    # outside of comments and quotes, and keep the ones which are TREE commands.
+    res, start, depth, quoted = {}, 0, 0, False
+    for m in re.finditer(rb"[\[\]';]", mm):
+        c = m.group()
+        if quoted:
+            quoted = c != b"'"  # Escaped quotes ('') toggle twice.
+        elif depth:
+            depth += 1 if c == b'[' else (-1 if c == b']' else 0)
+        elif c == b'[':
+            depth = 1
+        elif c == b"'":
+            quoted = True
+        elif c == b';':
+            cmd = NEXUS_TREE.match(mm[start:min(start + 1024, m.end())])
+            if cmd:
+                name = cmd.group(1).decode('utf8')
+                if name.startswith("'"):
+                    name = name[1:-1].replace("''", "'")
+                res[name] = (start, m.end())
+            start = m.end()
+    return res
+
+
+def tree_offsets(tree: 'pycldf.trees.Tree') \
+        -> typing.Optional[typing.Dict[str, typing.Tuple[int, int]]]:
+    """
+    Byte ranges of the trees in the file of `tree`, keyed by tree name.
+
+    The index is built when first requested and persisted in a file `.cldfviz-trees.json` in the
+    dataset directory (if possible), keyed by path, size and modification time of the tree file.
+
+    :return: `None`, if the tree file cannot be indexed, e.g. because it is not a local file.
+    """
+    f = tree.file
+    p = f.local_path() if f.scheme == 'file' and not f.path_in_zip else None
+    if p is None or not p.exists() or \
+            codecs.lookup(f.mimetype.encoding).name not in {'utf-8', 'ascii', 'iso8859-1'}:
+        return None
+    stat = p.stat()
+    key = [stat.st_size, stat.st_mtime_ns]
+    index_path = pathlib.Path(f._dsdir) / TREE_INDEX
+    if index_path not in _tree_indexes:
+        try:
+            _tree_indexes[index_path] = json.loads(index_path.read_text(encoding='utf8'))
+        except (OSError, ValueError):
+            _tree_indexes[index_path] = {}
+    index = _tree_indexes[index_path]
+    if f.relpath not in index or index[f.relpath]['key'] != key:
+        with p.open('rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            offsets = _newick_offsets(mm) if f.mimetype == 'text/x-nh' else _nexus_offsets(mm)
+        index[f.relpath] = dict(key=key, trees=offsets)
+        try:
+            tmp = index_path.parent / (index_path.name + '.tmp')
+            tmp.write_text(json.dumps(index), encoding='utf8')
+            tmp.replace(index_path)
+        except OSError:  # pragma: no cover
+            pass  # The dataset directory may be read-only.
+    return {k: tuple(v) for k, v in index[f.relpath]['trees'].items()}
+
+
+def read_tree(tree: 'pycldf.trees.Tree', strip_comments: bool = False) -> newick.Node:
+    """
+    Read the Newick tree for `tree`, only reading and parsing the relevant part of the tree file.
+
+    This is equivalent to `pycldf.trees.Tree.newick`, which reads and parses all trees in a file,
+    i.e. is slow for big files with samples of trees.
+    """
+    offsets = tree_offsets(tree)
+    if offsets is None or tree.name not in offsets:
+        return tree.newick(strip_comments=strip_comments)
+    start, end = offsets[tree.name]
+    with tree.file.local_path().open('rb') as fp:
+        fp.seek(start)
+        text = fp.read(end - start).decode(tree.file.mimetype.encoding)
+    if tree.file.mimetype == 'text/x-nh':
+        nwk = text.strip()
+    else:
+        # We parse the single TREE command - without translation, like pycldf.
+        trees = Nexus('#NEXUS\nBEGIN TREES;\n{}\nEND;'.format(text)).TREES.trees
+        if len(trees) != 1 or trees[0].name != tree.name:  # pragma: no cover
+            return tree.newick(strip_comments=strip_comments)
+        nwk = trees[0].newick_string
+    return newick.loads(nwk, strip_comments=strip_comments)[0]
@@ -3,50 +3,361 @@ We provide a Glottolog object that abstracts whether the data is accessed via py
 from glottolog/glottolog-like data or via pycldf.Dataset from glottolog/glottolog-cldf-like
 data.
 """
+import copy
+import typing
+import pathlib
+import functools
+import sqlite3
 import argparse
 import collections
+import collections.abc
 
 import attr
+import numpy as np
 from pycldf import Dataset
-from pycldf.ext import discovery
 from cldfbench.cli_util import add_catalog_spec, IGNORE_MISSING
 from clldutils.clilib import PathType
+from clldutils.path import walk
 import newick
 
+from cldfviz.cache import fingerprint, add_cache_dir
+from cldfviz.dsutils import iter_rows, existing_columns, get_dataset
+
 try:
     import pyglottolog
+    import pyglottolog.languoids
 except ImportError:  # pragma: no cover
     pyglottolog = None
 
-__all__ = ['Glottolog', 'Languoid']
+__all__ = [
+    'Glottolog', 'Languoid', 'LanguoidIndex', 'LazyLanguoids', 'CoordinateTable', 'iter_languoids']
 
 
-@attr.s
+@attr.s(slots=True)
 class Languoid:
     id = attr.ib()
     name = attr.ib()
     lat = attr.ib()
     lon = attr.ib()
+    # Glottocodes of the ancestors, starting with the top-level family (or None if not known):
+    lineage = attr.ib(default=None)
 
     @classmethod
     def from_dict(cls, d):
-        return cls(id=d['id'], name=d['name'], lat=d['latitude'], lon=d['longitude'])
+        return cls(
+            id=d['id'],
+            name=d['name'],
+            lat=d['latitude'],
+            lon=d['longitude'],
+            lineage=d.get('lineage'))
 
     @classmethod
     def from_languoid(cls, lang):
-        return cls(id=lang.id, name=lang.name, lat=lang.latitude, lon=lang.longitude)
+        return cls(
+            id=lang.id,
+            name=lang.name,
+            lat=lang.latitude,
+            lon=lang.longitude,
+            lineage=[gc for _, gc, _ in lang.lineage])
 
 
-class Glottolog(collections.UserDict):
+class CoordinateTable:
+    """
+    Coordinates of languoids as NumPy structured array with fields `lat` and `lon` (NaN for
+    languoids without coordinates) plus an index mapping Glottocodes to rows.
+    """
+    dtype = np.dtype([('lat', np.float64), ('lon', np.float64)])
+
+    def __init__(self, languoids: typing.Iterable[Languoid]):
+        languoids = list(languoids)
+        self.index = {lg.id: i for i, lg in enumerate(languoids)}
+        # An additional last row with NaN coordinates is gathered for unknown Glottocodes:
+        self.array = np.full(len(languoids) + 1, np.nan, dtype=self.dtype)
+        for field in ['lat', 'lon']:
+            self.array[field][:-1] = [
+                np.nan if getattr(lg, field) is None else float(getattr(lg, field))
+                for lg in languoids]
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, gc):
+        return gc in self.index
+
+    def rows(self, glottocodes: typing.Iterable[str]) -> np.ndarray:
+        """
+        Row numbers for `glottocodes` (-1 for unknown Glottocodes).
+        """
+        return np.fromiter((self.index.get(gc, -1) for gc in glottocodes), dtype=np.intp)
+
+    def lookup(self, glottocodes: typing.Iterable[str]) -> np.ndarray:
+        """
+        Coordinates for `glottocodes` as structured array (NaN for unknown Glottocodes).
+        """
+        return self.array[self.rows(glottocodes)]
+
+    def centroid(self, glottocodes: typing.Iterable[str]) \
+            -> typing.Optional[typing.Tuple[float, float]]:
+        """
+        The geographic midpoint of the coordinates for `glottocodes` as (lat, lon) pair.
+
+        Averaging is done on 3D unit vectors, thus the midpoint of points on both sides of the
+        antimeridian is computed correctly.
+        """
+        coords = self.lookup(glottocodes)
+        coords = coords[~(np.isnan(coords['lat']) | np.isnan(coords['lon']))]
+        if len(coords) == 0:
+            return None
+        if len(coords) == 1:
+            return float(coords['lat'][0]), float(coords['lon'][0])
+        lat, lon = np.radians(coords['lat']), np.radians(coords['lon'])
+        x = np.mean(np.cos(lat) * np.cos(lon))
+        y = np.mean(np.cos(lat) * np.sin(lon))
+        z = np.mean(np.sin(lat))
+        return float(np.degrees(np.arctan2(z, np.hypot(x, y)))), float(np.degrees(np.arctan2(y, x)))
+
+
+def iter_languoids(api_or_dataset,
+                   with_lineage: bool = True,
+                   glottocodes: typing.Optional[typing.Set[str]] = None) \
+        -> typing.Generator[Languoid, None, None]:
+    """
+    Read languoids from a `pyglottolog.Glottolog` API or a glottolog-cldf dataset.
+
+    :param with_lineage: Whether to read lineages from the glottolog-cldf ValueTable too \
+    (which is expensive).
+    :param glottocodes: Only read the languoids for these Glottocodes from the dataset.
+    """
+    if isinstance(api_or_dataset, Dataset):
+        ds, lineages = api_or_dataset, {}
+        if with_lineage and 'ValueTable' in ds:
+            lineages = {
+                row['languageReference']: [gc for gc in row['value'].split('/') if gc]
+                for row in iter_rows(
+                    ds, 'ValueTable', 'languageReference', 'value',
+                    filters={'parameterReference': {'classification'}}) if row['value']}
+        for row in iter_rows(
+                ds,
+                'LanguageTable',
+                *existing_columns(ds, 'LanguageTable', 'id', 'name', 'latitude', 'longitude'),
+                filters={'id': glottocodes} if glottocodes is not None else None):
+            row.setdefault('latitude', None)
+            row.setdefault('longitude', None)
+            lg = Languoid.from_dict(row)
+            if with_lineage:
+                lg.lineage = lineages.get(lg.id, [])
+            yield lg
+    else:
+        for lang in api_or_dataset.languoids():
+            yield Languoid.from_languoid(lang)
+
+
+class LazyLanguoids(collections.abc.Mapping):
+    """
+    A mapping of Glottocodes to `Languoid` objects, reading languoids only when they are requested.
+
+    - With pyglottolog, only the INI files of requested languoids (and their ancestors) are read.
+    - With glottolog-cldf, lookups should be batched by calling `prefetch`. Other lookups of \
+      unknown Glottocodes trigger reading the full LanguageTable (once).
+    """
     def __init__(self, api_or_dataset):
         self.api = api_or_dataset
-        super().__init__()
+        self._languoids = {}  # Maps Glottocodes to Languoid or None, if not in Glottolog.
+        self._complete = False
+        self._nodes = {}  # Lineage data of ancestors, shared between calls of `from_dir`.
+
+    @functools.cached_property
+    def _dirs(self) -> typing.Dict[str, pathlib.Path]:
+        # Listing the directory tree is cheap compared to reading the INI files:
+        return {d.name: d for d in walk(self.api.tree, mode='dirs')}
+
+    def prefetch(self, glottocodes: typing.Iterable[str]):
+        glottocodes = {gc for gc in glottocodes if gc and gc not in self._languoids}
+        if self._complete or not glottocodes:
+            return
         if isinstance(self.api, Dataset):
-            for row in self.api.iter_rows('LanguageTable', 'id', 'name', 'latitude', 'longitude'):
-                self[row['id']] = Languoid.from_dict(row)
+            for lg in iter_languoids(self.api, with_lineage=False, glottocodes=glottocodes):
+                self._languoids[lg.id] = lg
         else:
-            for lang in self.api.languoids():
-                self[lang.id] = Languoid.from_languoid(lang)
+            for gc in glottocodes:
+                if gc in self._dirs:
+                    lang = pyglottolog.languoids.Languoid.from_dir(
+                        self._dirs[gc], nodes=self._nodes, _api=self.api)
+                    self._languoids[gc] = Languoid.from_languoid(lang)
+        for gc in glottocodes:
+            self._languoids.setdefault(gc, None)
+
+    def _load_all(self):
+        if not self._complete:
+            if isinstance(self.api, Dataset):
+                self._languoids = {lg.id: lg for lg in iter_languoids(self.api, with_lineage=False)}
+            else:
+                self.prefetch(self._dirs)
+            self._complete = True
+
+    def __getitem__(self, gc):
+        if gc and gc not in self._languoids:
+            if isinstance(self.api, Dataset):
+                self._load_all()
+            else:
+                self.prefetch([gc])
+        res = self._languoids.get(gc)
+        if res is None:
+            raise KeyError(gc)
+        return res
+
+    def __iter__(self):
+        self._load_all()
+        return (gc for gc, lg in self._languoids.items() if lg)
+
+    def __len__(self):
+        self._load_all()
+        return sum(1 for lg in self._languoids.values() if lg)
+
+
+class LanguoidIndex(collections.abc.Mapping):
+    """
+    A read-only mapping of Glottocodes to `Languoid` objects, backed by a SQLite database.
+
+    Since languoids are only read from the database when they are looked up, opening an index
+    is fast - in contrast to reading all of Glottolog.
+    """
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self._db = sqlite3.connect(str(path))
+
+    @classmethod
+    def create(cls, path: pathlib.Path, languoids: typing.Iterable[Languoid]) -> 'LanguoidIndex':
+        """
+        Write the index database for `languoids` to `path`.
+        """
+        tmp = path.parent / (path.name + '.tmp')
+        if tmp.exists():  # pragma: no cover
+            tmp.unlink()
+        db = sqlite3.connect(str(tmp))
+        with db:
+            db.execute(
+                "CREATE TABLE languoid "
+                "(id TEXT PRIMARY KEY, name TEXT, lat REAL, lon REAL, lineage TEXT)")
+            db.executemany(
+                "INSERT INTO languoid VALUES (?, ?, ?, ?, ?)",
+                ((lg.id,
+                  lg.name,
+                  None if lg.lat is None else float(lg.lat),
+                  None if lg.lon is None else float(lg.lon),
+                  None if lg.lineage is None else '/'.join(lg.lineage)) for lg in languoids))
+        db.close()
+        tmp.replace(path)
+        return cls(path)
+
+    @classmethod
+    def from_cache(cls,
+                   cache_dir: pathlib.Path,
+                   key: str,
+                   languoids: typing.Callable[[], typing.Iterable[Languoid]]) -> 'LanguoidIndex':
+        """
+        Open the index for `key` in `cache_dir` - creating it from `languoids()` if necessary.
+        """
+        path = pathlib.Path(cache_dir) / 'glottolog-{}.sqlite'.format(fingerprint(key))
+        if path.exists():
+            return cls(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return cls.create(path, languoids())
+
+    def __getitem__(self, gc):
+        row = self._db.execute(
+            "SELECT id, name, lat, lon, lineage FROM languoid WHERE id = ?", (gc,)).fetchone()
+        if row is None:
+            raise KeyError(gc)
+        return Languoid(
+            id=row[0],
+            name=row[1],
+            lat=row[2],
+            lon=row[3],
+            lineage=None if row[4] is None else [c for c in row[4].split('/') if c])
+
+    def __contains__(self, gc):
+        return self._db.execute(
+            "SELECT 1 FROM languoid WHERE id = ?", (gc,)).fetchone() is not None
+
+    def __iter__(self):
+        return (row[0] for row in self._db.execute("SELECT id FROM languoid ORDER BY id"))
+
+    def __len__(self):
+        return self._db.execute("SELECT count(*) FROM languoid").fetchone()[0]
+
+
+def _data_key(api_or_dataset) -> list:
+    if isinstance(api_or_dataset, Dataset):
+        return ['cldf', fingerprint(api_or_dataset)]
+    return ['api', str(api_or_dataset.repos.resolve()), api_or_dataset.describe()]
+
+
+_INSTANCES = {}  # Glottolog instances created from cli arguments, keyed by the data locators.
+
+
+class Glottolog(collections.UserDict):
+    """
+    A mapping of Glottocodes to `Languoid` objects.
+
+    :param api_or_dataset: A `pyglottolog.Glottolog` instance or a glottolog-cldf `Dataset`.
+    :param cache_dir: If specified, languoids are read from a persistent `LanguoidIndex` in this \
+    directory, which is keyed on the `git describe` output for the Glottolog repository or on the \
+    fingerprint of the glottolog-cldf dataset.
+    :param lazy: If `True` (and no `cache_dir` is given), languoids are only read when requested \
+    (see `LazyLanguoids`).
+    """
+    def __init__(self,
+                 api_or_dataset,
+                 cache_dir: typing.Optional[pathlib.Path] = None,
+                 lazy: bool = False):
+        self.api = api_or_dataset
+        self._trees, self._nodes, self._coordinates = {}, {}, None
+        super().__init__()
+        if cache_dir:
+            self.data = LanguoidIndex.from_cache(cache_dir, self.cache_key, self.iter_languoids)
+        elif lazy:
+            self.data = LazyLanguoids(self.api)
+        else:
+            self.data = {lg.id: lg for lg in self.iter_languoids(with_lineage=False)}
+
+    def __bool__(self):
+        # An empty-looking - i.e. lazily loaded - Glottolog is still a Glottolog. Note that the
+        # default truth test would call `__len__`, i.e. read the full catalog.
+        return True
+
+    @functools.cached_property
+    def cache_key(self) -> list:
+        """
+        Identifies the Glottolog data, e.g. to key data derived from it in a cache.
+        """
+        return _data_key(self.api)
+
+    def iter_languoids(self, with_lineage: bool = True) -> typing.Generator[Languoid, None, None]:
+        return iter_languoids(self.api, with_lineage=with_lineage)
+
+    def prefetch(self, glottocodes: typing.Iterable[str]):
+        """
+        Make sure the languoids for `glottocodes` are loaded - in one batch, if possible.
+        """
+        if hasattr(self.data, 'prefetch'):
+            self.data.prefetch(glottocodes)
+
+    def coordinates(self, glottocodes: typing.Optional[typing.Iterable[str]] = None) \
+            -> CoordinateTable:
+        """
+        Coordinates of languoids as `CoordinateTable`.
+
+        :param glottocodes: If specified, only the coordinates of these languoids are needed - \
+        otherwise the table for all languoids is created (and cached).
+        """
+        if glottocodes is None or self._coordinates is not None:
+            if self._coordinates is None:
+                self._coordinates = CoordinateTable(self.values())
+            return self._coordinates
+        glottocodes = set(glottocodes)
+        self.prefetch(glottocodes)
+        return CoordinateTable(self[gc] for gc in glottocodes if gc in self)
 
     @staticmethod
     def add(parser):
@@ -64,25 +375,121 @@ class Glottolog(collections.UserDict):
             )
         except argparse.ArgumentError:
             pass
+        add_cache_dir(parser)
 
     @classmethod
-    def from_args(cls, args):
-        if args.glottolog_cldf:
-            return cls(discovery.get_dataset(args.glottolog_cldf, download_dir=args.download_dir))
-        if args.glottolog:
-            if hasattr(args.glottolog, 'api'):
+    def from_args(cls, args) -> typing.Optional['Glottolog']:
+        """
+        Languoids are read lazily, or from the persistent index if `args.cache_dir` is given.
+
+        Instances are shared within a process, i.e. repeated calls - e.g. for multiple images in
+        `cldfviz.text` or from helpers like `get_tree` - return the same `Glottolog` if the same
+        Glottolog data is specified.
+        """
+        key = cls._args_key(args)
+        if key not in _INSTANCES:
+            source = cls._source_from_args(args)
+            _INSTANCES[key] = None if source is None else \
+                cls(source, cache_dir=getattr(args, 'cache_dir', None), lazy=True)
+        return _INSTANCES[key]
+
+    @classmethod
+    def cache_key_from_args(cls, args) -> typing.Optional[list]:
+        """
+        The `cache_key` of the Glottolog data specified in `args` - computed without loading it.
+        """
+        gl = _INSTANCES.get(cls._args_key(args))
+        if gl is not None:
+            return gl.cache_key
+        source = cls._source_from_args(args)
+        return None if source is None else _data_key(source)
+
+    @staticmethod
+    def _args_key(args):
+        glottolog = getattr(args, 'glottolog', None)
+        return (
+            getattr(args, 'glottolog_cldf', None),
+            str(getattr(glottolog, 'dir', glottolog)),
+            str(getattr(args, 'cache_dir', None)))
+
+    @staticmethod
+    def _source_from_args(args):
+        """
+        The `pyglottolog.Glottolog` instance or glottolog-cldf `Dataset` specified in `args`.
+        """
+        if getattr(args, 'glottolog_cldf', None):
+            return get_dataset(args.glottolog_cldf, download_dir=args.download_dir)
+        glottolog = getattr(args, 'glottolog', None)
+        if glottolog:
+            if hasattr(glottolog, 'api'):
                 # cldfbench has already initialized a pyglottolog.Glottolog instance!
-                return cls(args.glottolog.api)
-            if args.glottolog != IGNORE_MISSING:
+                return glottolog.api
+            if glottolog != IGNORE_MISSING:
                 assert pyglottolog
-                return cls(pyglottolog.Glottolog(args.glottolog))
+                return pyglottolog.Glottolog(glottolog)
 
-    def newick(self, gc):
-        if isinstance(self.api, Dataset):
-            for row in self.api.iter_rows(
-                    'ValueTable', 'languageReference', 'parameterReference', 'value'):
-                if row['languageReference'] == gc and \
-                        row['parameterReference'] == 'subclassification':
-                    return newick.loads(row['value'])[0]
-        else:
-            return self.api.languoid(gc).newick_node(template="{l.id}")
+    @functools.cached_property
+    def _classification(self) -> typing.Tuple[typing.Dict[str, str], typing.Dict[str, str]]:
+        """
+        Newick strings and top-level families keyed by Glottocode, read from a glottolog-cldf
+        ValueTable in one pass.
+        """
+        newicks, families = {}, {}
+        for row in iter_rows(
+                self.api, 'ValueTable', 'languageReference', 'parameterReference', 'value',
+                filters={'parameterReference': {'subclassification', 'classification'}}):
+            if row['value']:
+                if row['parameterReference'] == 'subclassification':
+                    newicks[row['languageReference']] = row['value']
+                else:
+                    families[row['languageReference']] = row['value'].split('/')[0]
+        return newicks, families
+
+    def _tree(self, gc) -> typing.Optional[newick.Node]:
+        if gc not in self._trees:
+            if isinstance(self.api, Dataset):
+                nwk = self._classification[0].get(gc)
+                self._trees[gc] = newick.loads(nwk)[0] if nwk else None
+            else:
+                lang = self.api.languoid(gc)
+                self._trees[gc] = lang.newick_node(template="{l.id}") if lang else None
+        return self._trees[gc]
+
+    def newick(self, gc) -> typing.Optional[newick.Node]:
+        """
+        The Glottolog classification below `gc`.
+
+        Parsed trees are cached, so a copy is returned, which can be modified freely.
+        """
+        tree = self._tree(gc)
+        return _copy_node(tree) if tree else None
+
+    def family(self, gc) -> str:
+        """
+        The Glottocode of the top-level family of `gc` (or `gc` itself for top-level languoids).
+        """
+        lineage = self[gc].lineage if gc in self else None
+        if lineage is None and isinstance(self.api, Dataset):
+            return self._classification[1].get(gc, gc)
+        return lineage[0] if lineage else gc
+
+    def subtree(self, gc) -> typing.Optional['newick.Node']:
+        """
+        The Glottolog classification below `gc`, extracted from the tree of its top-level family.
+
+        Since the family tree is parsed only once, this is more efficient than `newick` when
+        subtrees for multiple languoids of the same family are needed.
+        """
+        fam = self.family(gc)
+        if fam not in self._nodes:
+            tree = self._tree(fam)
+            self._nodes[fam] = {n.name: n for n in tree.walk()} if tree else {}
+        node = self._nodes[fam].get(gc)
+        return _copy_node(node) if node else None
+
+
+def _copy_node(node: newick.Node) -> newick.Node:
+    # Copy the subtree rooted at `node`, without copying its ancestors:
+    res = copy.deepcopy(node, {id(node.ancestor): None})
+    res.ancestor = None
+    return res
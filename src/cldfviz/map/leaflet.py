@@ -1,14 +1,20 @@
+import re
 import html
 import json
+import array
 import string
+import tempfile
 
 import attr
+import numpy as np
 from clldutils import svg
 from clldutils.html import HTML
 from clldutils.clilib import PathType
 from clldutils import jsonlib
 
-from cldfviz.colormap import get_shape_and_color, weighted_colors, SVG_SHAPE_MAP as SHAPE_MAP
+from cldfviz.colormap import (
+    get_shape_and_color, weighted_colors, hashable, MARKER_CACHE, SVG_SHAPE_MAP as SHAPE_MAP,
+)
 from .base import Map, PACIFIC_CENTERED
 from cldfviz.template import TEMPLATE_DIR
 import cldfviz
@@ -59,6 +65,71 @@ BASE_LAYERS = {
     ),
 }
 GEOJSON_LAYERS = {p.name.split('.')[0]: p for p in TEMPLATE_DIR.joinpath('map').glob('*.geojson*')}
+RENDER_MODES = ['icons', 'canvas', 'clusters']
+# Markers within grid cells of CLUSTER_CELL_SIZE pixels are clustered up to zoom CLUSTER_MAX_ZOOM:
+CLUSTER_CELL_SIZE = 60
+CLUSTER_MAX_ZOOM = 16
+# Template variables which are streamed, rather than substituted:
+STREAMED = re.compile(r'\$(geojson|overlay_geojson)\b')
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, separators=(',', ':'))
+
+
+def _iter_json_array(items):
+    yield '['
+    for i, item in enumerate(items):
+        if i:
+            yield ','
+        yield _dumps(item)
+    yield ']'
+
+
+def grid_clusters(lonlats, cell_size: int = CLUSTER_CELL_SIZE, max_zoom: int = CLUSTER_MAX_ZOOM):
+    """
+    Cluster points per zoom level, by grid cells of `cell_size` pixels in Web Mercator projection.
+
+    Since the grid of zoom level z + 1 subdivides the cells of zoom level z, a point which is not
+    clustered at zoom level z will not be clustered at higher zoom levels either.
+
+    :param lonlats: Sequence of (longitude, latitude) pairs.
+    :return: Pair (`minzoom`, `clusters`), where `minzoom` lists the zoom level from which on a \
+    point is displayed individually, and `clusters` lists for each zoom level up to the first one \
+    without clusters the clusters as `[lat, lon, count, south, west, north, east]`.
+    """
+    lonlats = np.asarray(lonlats, dtype=float).reshape(-1, 2)
+    lon, lat = lonlats[:, 0], lonlats[:, 1]
+    x = (lon + 180) / 360
+    y = (1 - np.arcsinh(np.tan(np.radians(np.clip(lat, -85.0511, 85.0511)))) / np.pi) / 2
+    minzoom = np.full(len(lonlats), max_zoom + 1, dtype=int)
+    clusters = []
+    for zoom in range(max_zoom + 1):
+        scale = 256 * 2 ** zoom / cell_size
+        cells = np.stack([np.floor(x * scale), np.floor(y * scale)], axis=1).astype(np.int64)
+        _, inverse, counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        single = (counts[inverse] == 1) & (minzoom > zoom)
+        minzoom[single] = zoom
+        level = []
+        if (counts > 1).any():
+            n = len(counts)
+            mean_lat = np.bincount(inverse, weights=lat, minlength=n) / counts
+            mean_lon = np.bincount(inverse, weights=lon, minlength=n) / counts
+            # South, west, north and east bounds of the clustered points:
+            bounds = [np.full(n, inf) for inf in [np.inf, np.inf, -np.inf, -np.inf]]
+            np.minimum.at(bounds[0], inverse, lat)
+            np.minimum.at(bounds[1], inverse, lon)
+            np.maximum.at(bounds[2], inverse, lat)
+            np.maximum.at(bounds[3], inverse, lon)
+            level = [
+                [round(float(mean_lat[c]), 5), round(float(mean_lon[c]), 5), int(counts[c]),
+                 *[float(b[c]) for b in bounds]]
+                for c in np.flatnonzero(counts > 1)]
+        if not level:
+            break
+        clusters.append(level)
+    return minzoom.tolist(), clusters
 
 
 @attr.s
@@ -78,7 +149,18 @@ class MapLeaflet(Map):
 
     def __init__(self, languages, args):
         Map.__init__(self, languages, args)
-        self.features = []
+        if getattr(args, 'render_mode', 'icons') == 'clusters' and \
+                (args.with_layers or args.with_layers_for_combinations):
+            raise ValueError('Layers cannot be combined with clustered markers.')
+        # GeoJSON features are serialized - one per line - to a temporary file when added, and
+        # streamed into the output when the map is written. For clustering, only the coordinates
+        # are kept in memory.
+        self._features = tempfile.TemporaryFile(mode='w+', encoding='utf8')
+        self._lonlats = array.array('d')
+        # Distinct icons (data URLs or canvas marker descriptions), referenced by index from the
+        # features:
+        self.icons = []
+        self._icon_ids = {}
         self.legend = ''
         self.css = set()
 
@@ -120,15 +202,38 @@ class MapLeaflet(Map):
             type=PathType(type='file'),
             default=None,
         )
+        parser.add_argument(
+            '--render-mode',
+            default='icons',
+            choices=RENDER_MODES,
+            help="How to render markers: 'icons' uses an image per marker, 'canvas' draws markers "
+                 "on a canvas, and 'clusters' draws markers on a canvas, clustering nearby "
+                 "markers at low zoom levels. The latter two modes are recommended for maps with "
+                 "thousands of languages. {}".format(help_suffix),
+        )
+        parser.add_argument(
+            '--coordinate-precision',
+            type=int,
+            default=None,
+            help='Number of decimal places to round language coordinates to, e.g. 5 for a '
+                 'precision of about one metre. {}'.format(help_suffix),
+        )
 
     def _lonlat(self, language):
         lon, lat = language.lon, language.lat
         if self.args.pacific_centered and lon <= PACIFIC_CENTERED - 180:
             # Anything west of 26°W is moved by 360°.
             lon += 360  # make the map pacific-centered.
+        if getattr(self.args, 'coordinate_precision', None) is not None:
+            return [round(lon, self.args.coordinate_precision),
+                    round(lat, self.args.coordinate_precision)]
         return [lon, lat]
 
-    def _icon(self, colors):
+    @staticmethod
+    def _shape_and_colors(colors):
+        """
+        :return: Pair (shape, color) for shape markers, (None, [(weight, color), ...]) for pies.
+        """
         scolors = []
         if isinstance(colors[0], list):
             ncolors = []
@@ -139,20 +244,48 @@ class MapLeaflet(Map):
         colors = [(1 / len(colors), t) if isinstance(t, str) else t for t in colors]
         res = get_shape_and_color(colors)
         if res:
-            if scolors:
-                return svg.icon(SHAPE_MAP[res[0]] + scolors[0].replace('#', ''))
-            return svg.icon(SHAPE_MAP[res[0]] + res[1].replace('#', ''))
+            return res[0], scolors[0] if scolors else res[1]
+        return None, colors
+
+    def _icon(self, colors):
+        shape, colors = self._shape_and_colors(colors)
+        if shape:
+            return svg.icon(SHAPE_MAP[shape] + colors.replace('#', ''))
         return svg.pie([c[0] for c in colors], [c[1] for c in colors], stroke_circle=True)
 
+    def _icon_url(self, colors):
+        return MARKER_CACHE.get(
+            ('leaflet', hashable(colors)), lambda: svg.data_url(self._icon(colors)))
+
+    def _canvas_marker(self, colors):
+        """
+        Marker description for drawing on a canvas: `[shape, color]` or `[null, [[weight, color]]]`
+        """
+        def make():
+            shape, cs = self._shape_and_colors(colors)
+            return [shape, cs if shape else [[round(w, 4), c] for w, c in cs]]
+
+        return MARKER_CACHE.get(('canvas', hashable(colors)), make)
+
+    def _icon_id(self, icon) -> int:
+        key = icon if isinstance(icon, str) else _dumps(icon)
+        if key not in self._icon_ids:
+            self._icon_ids[key] = len(self.icons)
+            self.icons.append(icon)
+        return self._icon_ids[key]
+
     def add_language(self, language, values, colormaps, spec=None):
-        icon = self._icon(weighted_colors(values, colormaps))
+        colors = weighted_colors(values, colormaps)
+        icon = self._icon_url(colors) \
+            if getattr(self.args, 'render_mode', 'icons') == 'icons' else \
+            self._canvas_marker(colors)
         props = {
             "name": language.name,
             "tooltip": language.name,
             "values": ' / '.join(
                 [self.args.value_template.format(
                     parameter=pid, code=vals[0].v) for pid, vals in values.items() if vals]),
-            "icon": svg.data_url(icon),
+            "icon": icon,
             "markersize": self.args.markersize,
             "tooltip_class": "tt",
         }
@@ -161,18 +294,22 @@ class MapLeaflet(Map):
                 self.css.add(spec.css)
             props.update(
                 {k: v for k, v in attr.asdict(spec).items() if v is not None and k != 'css'})
-        self.features.append({
+        props['icon'] = self._icon_id(props['icon'])
+        lonlat = self._lonlat(language)
+        if getattr(self.args, 'render_mode', 'icons') == 'clusters':
+            self._lonlats.extend(lonlat)
+        self._features.write(_dumps({
             # A language as GeoJSON point with svg marker icon
-            "geometry": {"coordinates": self._lonlat(language), "type": "Point"},
+            "geometry": {"coordinates": lonlat, "type": "Point"},
             "id": language.id,
             "properties": props,
             "type": "Feature"
-        })
+        }) + '\n')
 
     def add_legend(self, parameters, colormaps):
         def marker(colors):
             return HTML.img(
-                src=svg.data_url(self._icon(colors)),
+                src=self._icon_url(colors),
                 width="{}".format(min([20, self.args.markersize * 2])))
 
         trs = []
@@ -190,6 +327,8 @@ class MapLeaflet(Map):
                 min_, max_ = parameter.domain
                 tds_label = []
                 tds_color = []
+                colors = colormaps[pid].map_array(
+                    [min_ + j * (max_ - min_) / 10 for j in range(11)])
                 for j in range(11):
                     if j == 0:
                         tds_label.append(HTML.td(str(round(min_, 2))))
@@ -200,7 +339,7 @@ class MapLeaflet(Map):
                     tds_color.append(HTML.td(
                         ' ',
                         style='height: 20px; width: 1em; background-color: {};'.format(
-                            colormaps[pid](min_ + j * (max_ - min_) / 10))))
+                            colors[j])))
                 trs.append(HTML.tr(HTML.td(HTML.table(
                     HTML.tr(*tds_label),
                     HTML.tr(*tds_color)
@@ -217,6 +356,12 @@ class MapLeaflet(Map):
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         """write files"""
+        try:
+            self._write()
+        finally:
+            self._features.close()
+
+    def _write(self):
         import zipfile
 
         overlay_geojson, overlay_options = dict(features=[]), '{}'
@@ -233,9 +378,11 @@ class MapLeaflet(Map):
             if self.args.overlay_options:
                 overlay_options = self.args.overlay_options.read_text(encoding='utf8')
 
-        html_ = string.Template(
-            cldfviz.PKG_DIR.joinpath('templates', 'map', 'leaflet.html').read_text(encoding='utf8')
-        ).substitute(
+        minzoom, clusters = None, []
+        if getattr(self.args, 'render_mode', 'icons') == 'clusters':
+            minzoom, clusters = grid_clusters(self._lonlats)
+
+        values = dict(
             title=self.args.title or '',
             css='\n'.join(sorted(self.css)),
             legend=self.legend,
@@ -243,11 +390,44 @@ class MapLeaflet(Map):
                 'language_labels': self.args.language_labels,
                 'with_layers': self.args.with_layers,
                 'with_layers_for_combinations': self.args.with_layers_for_combinations,
+                'render_mode': getattr(self.args, 'render_mode', 'icons'),
             }),
             tile_url=json.dumps(BASE_LAYERS[self.args.base_layer][0]),
             tile_options=json.dumps(BASE_LAYERS[self.args.base_layer][1]),
-            geojson=json.dumps({"features": self.features, "type": "FeatureCollection"}),
-            overlay_geojson=json.dumps(overlay_geojson['features']),
+            icons=json.dumps(self.icons),
+            clusters=_dumps(clusters),
             overlay_options=html.escape(overlay_options, quote=False),
         )
-        self.args.output.write_text(html_, encoding='utf8')
+        streamed = dict(
+            geojson=lambda: self._iter_geojson(minzoom),
+            overlay_geojson=lambda: _iter_json_array(overlay_geojson['features']),
+        )
+        template = cldfviz.PKG_DIR.joinpath('templates', 'map', 'leaflet.html').read_text(
+            encoding='utf8')
+        # The template is written in chunks, with the (big) GeoJSON data streamed feature by
+        # feature rather than serialized in memory.
+        with self.args.output.open('w', encoding='utf8') as f:
+            chunks = STREAMED.split(template)
+            for i, chunk in enumerate(chunks):
+                if i % 2:
+                    f.writelines(streamed[chunk]())
+                else:
+                    f.write(string.Template(chunk).substitute(**values))
+
+    def _iter_features(self, minzoom=None):
+        self._features.seek(0)
+        for i, line in enumerate(self._features):
+            if minzoom is None:
+                yield line.rstrip('\n')
+            else:
+                feature = json.loads(line)
+                feature['properties']['minzoom'] = minzoom[i]
+                yield _dumps(feature)
+
+    def _iter_geojson(self, minzoom=None):
+        yield '{"features":['
+        for i, feature in enumerate(self._iter_features(minzoom)):
+            if i:
+                yield ','
+            yield feature
+        yield '],"type":"FeatureCollection"}'
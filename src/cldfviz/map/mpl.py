@@ -9,12 +9,11 @@ import attr
 import numpy as np
 import cartopy.feature
 import cartopy.crs
-from matplotlib import pyplot as plt
 from matplotlib.patches import Wedge, Rectangle, Circle
 from matplotlib.legend_handler import HandlerPatch
 from PIL import Image
 
-from cldfviz.colormap import get_shape_and_color, weighted_colors
+from cldfviz.colormap import get_shape_and_color, weighted_colors, hashable, MARKER_CACHE
 from .base import Map, PACIFIC_CENTERED
 
 SHAPE_MAP = {
@@ -88,6 +87,9 @@ class MapPlot(Map):
         self.proj = getattr(cartopy.crs, args.projection)(central_longitude=self.central_longitude)
 
     def __enter__(self):
+        # pyplot is imported only when plotting, to keep it off the import path of cldfviz.map.
+        from matplotlib import pyplot as plt
+
         plt.clf()
         fig = plt.figure(figsize=(self.args.width, self.args.height), dpi=self.args.dpi)
         ax = fig.add_subplot(1, 1, 1, projection=self.proj)
@@ -117,6 +119,8 @@ class MapPlot(Map):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        from matplotlib import pyplot as plt
+
         if self.args.title:
             plt.title(self.args.title)
         format = self.args.output.suffix.replace('.', '').lower()
@@ -285,7 +289,8 @@ class MapPlot(Map):
                 return
 
             # Use scatter to create pie-markers suitable for the projection.
-            for color, marker in self.pie_markers(colors):
+            for color, marker in MARKER_CACHE.get(
+                    ('mpl', hashable(colors)), lambda: list(self.pie_markers(colors))):
                 self.ax.scatter(
                     [language.lon], [language.lat],
                     marker=marker,
@@ -339,6 +344,8 @@ class MapPlot(Map):
                 fontsize='small')
 
     def add_legend(self, parameters, colormaps):
+        from matplotlib import pyplot as plt
+
         def wrapped_label(s):
             return '\n'.join(textwrap.wrap(s, width=20))
 
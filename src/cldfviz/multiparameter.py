@@ -1,23 +1,41 @@
+import sys
+import math
+import array
+import pickle
+import shutil
 import typing
+import weakref
+import pathlib
+import tempfile
 import decimal
 import functools
 import itertools
 import collections
 
 import attr
+import numpy as np
 import pycldf
 from pycldf import orm
 from pyglottolog.languoids import Languoid
 
 from cldfviz.glottolog import Glottolog
+from cldfviz.dsutils import iter_rows, existing_columns
 
 CONTINUOUS = 1
 CATEGORICAL = 2
 
 
 class Language:
+    __slots__ = ('id', 'name', 'lat', 'lon')
+
     def __init__(self, obj, glottolog: typing.Optional[Glottolog] = None):
-        glottolog = glottolog or {}
+        """
+        :param obj: A Glottocode, a `pycldf.orm.Language` or a `dict` as returned by \
+        `Dataset.iter_rows('LanguageTable', ...)` with keys `id`, `name`, `latitude`, \
+        `longitude` and `glottocode` (if available).
+        """
+        glottolog = {} if glottolog is None else glottolog
+        glottocode = None
         if isinstance(obj, str):
             obj = glottolog[obj]
             self.id = obj.id
@@ -29,20 +47,54 @@ class Language:
             self.name = obj.name
             self.lat = obj.cldf.latitude
             self.lon = obj.cldf.longitude
-            if self.lat is None and obj.cldf.glottocode in glottolog:
-                # FIXME: If a language is mapped to multiple glottocodes, we could try to take the
-                # midpoint of these as coordinate. (If longitudes have different signs, transform
-                # back and forth appropriately, i.e. lon < 0 => lon = 360 - abs(lon))
-                # shapely.geometry.MultiPoint([(0, 0), (1, 1)]).convex_hull.centroid
-                self.lat = glottolog[obj.cldf.glottocode].lat
-                self.lon = glottolog[obj.cldf.glottocode].lon
+            glottocode = obj.cldf.glottocode
+        elif isinstance(obj, dict) and 'id' in obj:
+            self.id = obj['id']
+            self.name = obj.get('name')
+            self.lat = obj.get('latitude')
+            self.lon = obj.get('longitude')
+            glottocode = obj.get('glottocode')
         else:
             raise TypeError(obj)
+        if self.lat is None and glottocode:
+            if hasattr(glottolog, 'coordinates'):
+                # If a language is mapped to multiple Glottocodes, we take their midpoint:
+                gcs = [glottocode] if isinstance(glottocode, str) else glottocode
+                self.lat, self.lon = glottolog.coordinates(gcs).centroid(gcs) or (None, None)
+            elif isinstance(glottocode, str) and glottocode in glottolog:
+                self.lat = glottolog[glottocode].lat
+                self.lon = glottolog[glottocode].lon
         self.lat = float(self.lat) if self.lat is not None else self.lat
         self.lon = float(self.lon) if self.lon is not None else self.lon
 
 
-@attr.s
+def geolocate(languages: typing.Iterable[typing.Tuple[Language, typing.Union[str, list]]],
+              glottolog: Glottolog):
+    """
+    Fill in missing coordinates of languages from Glottolog, looking up coordinates in bulk.
+
+    :param languages: Pairs of `Language` and Glottocode (or list of Glottocodes).
+    """
+    single, multiple = [], []
+    for lang, gc in languages:
+        if lang.lat is None and gc:
+            if isinstance(gc, str):
+                single.append((lang, gc))
+            else:
+                multiple.append((lang, gc))
+    if not (single or multiple):
+        return
+    table = glottolog.coordinates(
+        [gc for _, gc in single] + [gc for _, gcs in multiple for gc in gcs])
+    coords = table.lookup(gc for _, gc in single)
+    for (lang, _), lat, lon in zip(single, coords['lat'].tolist(), coords['lon'].tolist()):
+        if not (math.isnan(lat) or math.isnan(lon)):
+            lang.lat, lang.lon = lat, lon
+    for lang, gcs in multiple:
+        lang.lat, lang.lon = table.centroid(gcs) or (None, None)
+
+
+@attr.s(slots=True)
 class Parameter:
     id = attr.ib()
     name = attr.ib()
@@ -54,23 +106,33 @@ class Parameter:
     def from_object(cls, obj):
         return cls(id=obj.id, name=getattr(obj.cldf, 'name', obj.id))
 
+    @classmethod
+    def from_row(cls, row):
+        return cls(id=row['id'], name=row['name'] if 'name' in row else row['id'])
+
+
+def _to_float(v) -> typing.Optional[float]:
+    try:
+        return float(v)
+    except (ValueError, TypeError):
+        return None
+
 
 @functools.total_ordering
-@attr.s(order=False, eq=False)
+@attr.s(order=False, eq=False, slots=True)
 class Value:
+    """
+    A datapoint.
+
+    `float` is computed from `v` - unless it is passed in, e.g. from the columns of a `ValueStore`.
+    """
     v = attr.ib()
     pid = attr.ib()
     lid = attr.ib()
     code = attr.ib()
-    float = attr.ib(default=None)
+    float = attr.ib(default=attr.Factory(lambda self: _to_float(self.v), takes_self=True))
     weight = attr.ib(default=None)
 
-    def __attrs_post_init__(self):
-        try:
-            self.float = float(self.v)
-        except (ValueError, TypeError):
-            self.float = None
-
     def __eq__(self, other):
         return (self.lid, self.pid, self.v) == (other.lid, other.pid, other.v)
 
@@ -79,7 +141,11 @@ class Value:
 
     @classmethod
     def from_row(cls, row, codes, weight_col=None):
-        return cls(
+        return cls(**cls.kwargs_from_row(row, codes, weight_col=weight_col))
+
+    @staticmethod
+    def kwargs_from_row(row, codes, weight_col=None):
+        return dict(
             v=row.get('codeReference') or row['value'],
             lid=row['languageReference'],
             pid=row['parameterReference'],
@@ -89,11 +155,306 @@ class Value:
         )
 
 
+class Domain:
+    """
+    Accumulates - while datapoints are read - what is needed to infer the domain of a parameter.
+    """
+    def __init__(self):
+        self.numeric = True
+        self.numeric_type = True
+        self.counts = collections.Counter()
+        self.min, self.max = math.inf, -math.inf
+
+    @property
+    def categorical(self) -> bool:
+        """
+        Whether the counts of distinct values may still be needed to infer the domain - i.e. the
+        values are not numeric or too few distinct numbers have been seen.
+        """
+        return not self.numeric or len(self.counts) <= 8
+
+    def add(self, v, f: float):
+        self.counts[v] += 1
+        if self.numeric_type and not isinstance(v, (int, float, decimal.Decimal)):
+            self.numeric_type = False
+        if self.numeric:
+            if math.isnan(f):
+                self.numeric = False
+            else:
+                self.min, self.max = min(self.min, f), max(self.max, f)
+
+    def finalize(self, parameter: Parameter, datatype: typing.Optional[str] = None):
+        """
+        Set type and domain of `parameter`.
+        """
+        if self.counts and self.numeric and (len(self.counts) > 8 or datatype == 'number'):
+            parameter.type = CONTINUOUS
+            parameter.domain = (self.min, self.max)
+        else:
+            # Order by descending frequency, ties by order of first occurrence:
+            parameter.domain = collections.OrderedDict(
+                (v, v) for v in sorted(self.counts, key=lambda vv: -self.counts[vv]))
+
+
+class Interned(list):
+    """
+    A list of distinct objects, providing integer IDs for them.
+    """
+    def __init__(self):
+        list.__init__(self)
+        self.ids = {}
+
+    def id(self, obj) -> int:
+        try:
+            return self.ids[obj]
+        except KeyError:
+            self.ids[obj] = len(self)
+            self.append(obj)
+            return self.ids[obj]
+
+
+class _SpilledValues:
+    """
+    Read-only access to the distinct values of a run, by ID.
+    """
+    def __init__(self, fname: str):
+        fname = pathlib.Path(fname)
+        self.offsets = np.memmap(str(fname.with_suffix('.offsets')), dtype=np.int64, mode='r')
+        self.data = np.memmap(str(fname.with_suffix('.vals')), dtype=np.uint8, mode='r') \
+            if self.offsets[-1] else b''
+
+    def __getitem__(self, i: int):
+        return pickle.loads(bytes(self.data[self.offsets[i]:self.offsets[i + 1]]))
+
+
+class ValueStore:
+    """
+    Columnar storage for the datapoints of a `MultiParameter`.
+
+    Language IDs, parameter IDs, raw values and codes are interned and stored as integer IDs, float
+    representations and weights as float columns (with NaN signaling `None`). While datapoints are
+    added, columns are kept as compact `array.array`; after `freeze` they are available as NumPy
+    arrays. `Value` objects are only created on request.
+
+    If a `memory_budget` is given, columns and distinct values exceeding it are sorted by language
+    and spilled to temporary files ("runs"). Datapoints of a spilled store can only be accessed
+    grouped by language, via `iter_languages`, reading the runs as memory-mapped arrays. The counts
+    of distinct values (see `Domain`) and the mapping of raw values to codes are spilled with each
+    run, too, and merged in `freeze` - as far as they are needed, i.e. for categorical parameters.
+    """
+    COLUMNS = [
+        ('lang', 'i', np.int32),
+        ('param', 'i', np.int32),
+        ('value', 'i', np.int32),
+        ('code', 'i', np.int32),
+        ('float', 'd', np.float64),
+        ('weight', 'd', np.float64),
+    ]
+    RECORD = np.dtype([(name, dtype) for name, _, dtype in COLUMNS])
+
+    def __init__(self, memory_budget: typing.Optional[int] = None):
+        """
+        :param memory_budget: Maximal number of bytes to use for the value columns and the \
+        (approximate size of the) distinct values in memory.
+        """
+        self.lids, self.pids, self.codes = Interned(), Interned(), Interned()
+        self._reset()
+        self.domains = collections.defaultdict(Domain)
+        self.memory_budget = memory_budget
+        self.runs = []
+        self._spill_dir = None
+        self._spilled = 0
+
+    def _reset(self):
+        for name, typecode, _ in self.COLUMNS:
+            setattr(self, name, array.array(typecode))
+        # Distinct values and the mapping of raw values to codes are collected per run:
+        self.vals = Interned()
+        self.value_to_code = collections.defaultdict(dict)
+        self._vals_size = 0
+
+    def __len__(self):
+        return self._spilled + len(self.lang)
+
+    @property
+    def spilled(self) -> bool:
+        return bool(self.runs)
+
+    @staticmethod
+    def _float(v):
+        if v is None:
+            return math.nan
+        try:
+            return float(v)
+        except (ValueError, TypeError):
+            return math.nan
+
+    def add(self, v, pid, lid, code, weight=None):
+        self.lang.append(self.lids.id(lid))
+        self.param.append(self.pids.id(pid))
+        nvals = len(self.vals)
+        self.value.append(self.vals.id(v))
+        if self.memory_budget and len(self.vals) > nvals:
+            self._vals_size += sys.getsizeof(v)
+        self.code.append(self.codes.id(code))
+        f = self._float(v)
+        self.float.append(f)
+        self.domains[pid].add(v, f)
+        self.weight.append(self._float(weight))
+        if self.memory_budget and \
+                len(self.lang) * self.RECORD.itemsize + self._vals_size >= self.memory_budget:
+            self.spill()
+
+    def add_code(self, pid, value: str, code):
+        """
+        Record the code of a raw value of parameter `pid` (see `Parameter.value_to_code`).
+        """
+        if value not in self.value_to_code[pid]:
+            self._vals_size += sys.getsizeof(value)
+        self.value_to_code[pid][value] = code
+
+    def spill(self):
+        """
+        Write the datapoints currently held in memory - sorted by language - to a new run.
+
+        The distinct values referenced by the run are written - pickled - to a separate file,
+        together with their byte offsets. The counts of distinct values and the value-to-code
+        mappings collected for the run are pickled to a third file.
+        """
+        if self._spill_dir is None:
+            self._spill_dir = pathlib.Path(tempfile.mkdtemp(prefix='cldfviz-'))
+            weakref.finalize(self, shutil.rmtree, str(self._spill_dir), ignore_errors=True)
+        records = np.empty(len(self.lang), dtype=self.RECORD)
+        for name, _, _ in self.COLUMNS:
+            records[name] = getattr(self, name)
+        fname = self._spill_dir / 'run-{}.bin'.format(len(self.runs))
+        fname.write_bytes(records[np.argsort(records['lang'], kind='stable')].tobytes())
+        offsets = array.array('q', [0])
+        with fname.with_suffix('.vals').open('wb') as f:
+            for v in self.vals:
+                offsets.append(offsets[-1] + f.write(pickle.dumps(v)))
+        fname.with_suffix('.offsets').write_bytes(offsets.tobytes())
+        with fname.with_suffix('.counts').open('wb') as f:
+            pickle.dump(
+                ({pid: d.counts for pid, d in self.domains.items() if d.counts},
+                 dict(self.value_to_code)),
+                f)
+        for domain in self.domains.values():
+            domain.counts = collections.Counter()
+        self.runs.append(str(fname))
+        self._spilled += len(self.lang)
+        self._reset()
+
+    def freeze(self, categorical: typing.Container[str] = ()):
+        """
+        :param categorical: IDs of parameters which may be categorical, independent of their \
+        values - e.g. because their codes are given in a CodeTable.
+        """
+        if self.runs:
+            if len(self.lang):
+                self.spill()
+            self._merge_runs(categorical)
+        for name, _, dtype in self.COLUMNS:
+            setattr(self, name, np.array(getattr(self, name), dtype=dtype))
+        return self
+
+    def _merge_runs(self, categorical):
+        # Merge the counts - in the order of the runs, thus keeping the order of first occurrence -
+        # as long as they are needed, i.e. up to 9 distinct values for numeric parameters. The
+        # value-to-code mappings are only kept for categorical parameters.
+        for fname in self.runs:
+            with pathlib.Path(fname).with_suffix('.counts').open('rb') as f:
+                counts, value_to_code = pickle.load(f)
+            for pid, c in counts.items():
+                domain = self.domains[pid]
+                if pid in categorical or domain.categorical:
+                    domain.counts.update(c)
+                    if pid not in categorical and domain.numeric:
+                        domain.counts = collections.Counter(
+                            dict(itertools.islice(domain.counts.items(), 9)))
+            for pid, m in value_to_code.items():
+                if pid in categorical or self.domains[pid].categorical:
+                    self.value_to_code[pid].update(m)
+        for pid, domain in self.domains.items():
+            if pid not in categorical and not domain.categorical:
+                self.value_to_code.pop(pid, None)
+
+    def pid_mask(self, pid: str) -> np.ndarray:
+        if pid not in self.pids.ids:
+            return np.zeros(len(self.param), dtype=bool)
+        return self.param == self.pids.ids[pid]
+
+    def _value(self, lang, param, value, code, f, weight, vals=None) -> 'Value':
+        return Value(
+            v=(self.vals if vals is None else vals)[value],
+            pid=self.pids[param],
+            lid=self.lids[lang],
+            code=self.codes[code],
+            float=None if math.isnan(f) else float(f),
+            weight=None if math.isnan(weight) else float(weight),
+        )
+
+    def get(self, i: int) -> 'Value':
+        return self._value(*(getattr(self, name)[i] for name, _, _ in self.COLUMNS))
+
+    def value_factory(self) -> typing.Callable[[typing.Iterable[int]], typing.List['Value']]:
+        """
+        A function creating the `Value` objects for a list of row numbers - much faster than `get`
+        when called for many rows, because the columns are resolved to Python objects only once.
+        """
+        def none_for_nan(col):
+            nan = np.isnan(col)
+            if nan.all():
+                return [None] * len(col)
+            col = col.astype(object)
+            col[nan] = None
+            return col.tolist()
+
+        v, pid, lid, code = [
+            list(map(objs.__getitem__, col.tolist())) for objs, col in [
+                (self.vals, self.value),
+                (self.pids, self.param),
+                (self.lids, self.lang),
+                (self.codes, self.code)]]
+        f, weight = none_for_nan(self.float), none_for_nan(self.weight)
+
+        def make(rows):
+            return [Value(v[i], pid[i], lid[i], code[i], f[i], weight[i]) for i in rows]
+        return make
+
+    def iter_languages(self) -> typing.Iterator[typing.Tuple[str, typing.List['Value']]]:
+        """
+        Iterate over the datapoints of a spilled store, grouped by language.
+
+        Only the datapoints for one language are held in memory at a time.
+        """
+        runs = [np.memmap(fname, dtype=self.RECORD, mode='r') for fname in self.runs]
+        vals = [_SpilledValues(fname) for fname in self.runs]
+        starts = [0] * len(runs)
+        for lang in range(len(self.lids)):
+            values = []
+            for i, run in enumerate(runs):
+                end = int(np.searchsorted(run['lang'], lang, side='right'))
+                for rec in run[starts[i]:end].tolist():
+                    values.append(self._value(*rec, vals=vals[i]))
+                starts[i] = end
+            if values:
+                yield self.lids[lang], values
+
+    def __iter__(self):
+        if self.spilled:
+            for _, values in self.iter_languages():
+                yield from values
+        else:
+            yield from self.value_factory()(range(len(self)))
+
+
 class MultiParameter:
     """
     Extracts relevant data about a set of parameters from a CLDF dataset.
 
     :ivar parameters: `OrderedDict` mapping parameter IDs to :class:`Parameter` instances.
+    :ivar store: :class:`ValueStore` holding the datapoints.
     """
     def __init__(self,
                  ds: pycldf.Dataset,
@@ -104,24 +465,67 @@ class MultiParameter:
                  language_properties: typing.Optional[typing.Iterable[str]] = None,
                  language_filter: typing.Optional[typing.Callable[[orm.Object], bool]] = None,
                  weight_col=None,
-                 exclude_lang=None):
+                 exclude_lang=None,
+                 memory_budget: typing.Optional[int] = None,
+                 jobs: typing.Optional[int] = None):
+        """
+        :param language_filter: Predicate for `pycldf.orm.Language` objects - or an object with \
+        a `select` method, returning the IDs of matching languages for a dataset (such as \
+        `cldfviz.cli_util.LanguageFilter`).
+        :param memory_budget: Maximal number of bytes to use for holding datapoints in memory. \
+        If more is needed, datapoints are spilled to disk (see `ValueStore`).
+        :param jobs: Number of processes to use for reading the ValueTable (or FormTable).
+        """
         self.include_missing = include_missing
         language_properties = language_properties or []
 
-        if 'LanguageTable' in ds:
-            langs = {lg.id: Language(lg, glottolog=glottolog)
-                     for lg in ds.objects('LanguageTable')
-                     if language_filter is None or language_filter(lg)}
+        # We read LanguageTable once, collecting languages as well as language property values.
+        # If possible, missing coordinates are looked up in Glottolog in bulk, (see `geolocate`):
+        bulk = hasattr(glottolog, 'coordinates')
+        langs, language_rows, glottocodes = {}, [], []
+        selection = None
+        if 'LanguageTable' in ds and hasattr(language_filter, 'select'):
+            # A compiled filter selects the matching language IDs column-wise.
+            selection, language_filter = language_filter.select(ds), None
+        if 'LanguageTable' in ds and language_filter:
+            # Other language filters operate on ORM objects.
+            for lg in ds.objects('LanguageTable'):
+                if language_filter(lg):
+                    langs[lg.id] = Language(lg, glottolog=None if bulk else glottolog)
+                    glottocodes.append((langs[lg.id], lg.cldf.glottocode))
+                    language_rows.append((lg.id, [lg.data[lp] for lp in language_properties]))
+        elif 'LanguageTable' in ds:
+            for r in iter_rows(ds, 'LanguageTable', *existing_columns(
+                    ds, 'LanguageTable', 'id', 'name', 'latitude', 'longitude', 'glottocode'),
+                    *language_properties):
+                if selection is not None and r['id'] not in selection:
+                    continue
+                langs[r['id']] = Language(r, glottolog=None if bulk else glottolog)
+                glottocodes.append((langs[r['id']], r.get('glottocode')))
+                language_rows.append((r['id'], [r[lp] for lp in language_properties]))
         else:
+            gcs = set(r['languageReference'] for r in iter_rows(
+                ds,
+                'ValueTable',
+                'languageReference',
+                filters={'parameterReference': set(pids)} if pids else None))
+            if hasattr(glottolog, 'prefetch'):
+                # Glottolog data may be loaded lazily, so we look up the Glottocodes in one batch.
+                glottolog.prefetch(gcs)
             langs = {gc: Language(gc, glottolog=glottolog)
-                     for gc in set(r['languageReference'] for r in
-                                   ds.iter_rows('ValueTable', 'languageReference'))
-                     if glottolog and gc in glottolog}
+                     for gc in gcs if glottolog is not None and gc in glottolog}
+        if bulk and glottocodes:
+            geolocate(glottocodes, glottolog)
 
         langs = {
             k: v for k, v in langs.items() if v and (exclude_lang is None or not exclude_lang(v))}
-        params = {p.id: Parameter.from_object(p)
-                  for p in ds.objects('ParameterTable')} if 'ParameterTable' in ds else {}
+        params = {}
+        if 'ParameterTable' in ds and pids:
+            params = {r['id']: Parameter.from_row(r) for r in iter_rows(
+                ds,
+                'ParameterTable',
+                *existing_columns(ds, 'ParameterTable', 'id', 'name'),
+                filters={'id': set(pids)})}
         # For each pid, we add a parameter:
         self.parameters = collections.OrderedDict(
             [(pid, params.get(pid, Parameter(id=pid, name=pid))) for pid in pids])
@@ -138,96 +542,131 @@ class MultiParameter:
             for row in ds.iter_rows('CodeTable', 'id', 'parameterReference', 'name'):
                 if row['parameterReference'] in self.parameters:
                     codes[row['parameterReference']][row['id']] = row['name']
-        language_rows = []
-        for i, language_property in enumerate(language_properties):
-            if i == 0:
-                language_rows = [
-                    r for r in ds.iter_rows('LanguageTable', 'id', 'name')
-                    if r['id'] in langs]
-            if not all(isinstance(v[language_property], (int, float, decimal.Decimal))
-                       for v in language_rows if v[language_property] is not None):
-                counts = collections.Counter([r[language_property] for r in language_rows])
-                codes[language_property] = collections.OrderedDict([
-                    (p, p) for p in sorted(
-                        set(r[language_property] for r in language_rows
-                            if r[language_property] is not None),
-                        key=lambda x: -counts[x])
-                ])
         self.languages = collections.OrderedDict()
-        self.values = []
-        colmap = ['languageReference', 'parameterReference', 'value']
-        if codes:
-            colmap.append('codeReference')
+        self.store = ValueStore(memory_budget=memory_budget)
+        self._index = None
         if pids:
             seen = {pid: False for pid in pids}
             comp = 'ValueTable' if ds.module == 'StructureDataset' else 'FormTable'
-            for val in ds.iter_rows(comp, *colmap):
+            colmap = ['languageReference', 'parameterReference', 'value']
+            if codes:
+                colmap.append('codeReference')
+            if weight_col:
+                colmap.append(weight_col)
+            # Rows for other parameters are skipped before their cells are parsed:
+            for val in iter_rows(
+                    ds, comp, *colmap, filters={'parameterReference': set(pids)}, jobs=jobs):
                 seen[val['parameterReference']] = True
                 if ((val['value'] is not None) or self.include_missing) and \
                         val['parameterReference'] in self.parameters:
                     lang = langs.get(val['languageReference'])
                     if lang:
                         self.languages[val['languageReference']] = lang
-                        self.values.append(Value.from_row(val, codes, weight_col=weight_col))
-                        self.parameters[val['parameterReference']] \
-                            .value_to_code[str(val['value'])] = \
-                            val.get('codeReference') or val['Value']
+                        self.store.add(**Value.kwargs_from_row(val, codes, weight_col=weight_col))
+                        self.store.add_code(
+                            val['parameterReference'],
+                            str(val['value']),
+                            val.get('codeReference') or val['value'])
             if not all(seen[pid] for pid in pids):
                 raise ValueError('Invalid parameter ID')
-        for language_property in language_properties:
-            for lang in language_rows:
-                if (lang['id'] in langs) and lang[language_property] is not None:
-                    if lang['id'] in langs:
-                        self.languages.setdefault(lang['id'], langs[lang['id']])
-                        self.values.append(Value(
-                            v=lang[language_property],
-                            pid=language_property,
-                            lid=lang['id'],
-                            code=language_property))
-        if not self.values:
+        for lid, values in language_rows:
+            if lid in langs:
+                for language_property, v in zip(language_properties, values):
+                    if v is not None:
+                        self.languages.setdefault(lid, langs[lid])
+                        self.store.add(v=v, pid=language_property, lid=lid, code=language_property)
+        if not len(self.store):
             # No parameters and no language property specified: Just plot language locations.
-            if 'LanguageTable' not in ds:
-                for lid, lang in langs.items():
-                    self.languages.setdefault(lid, lang)
-                    self.values.append(Value(
-                        v='y',
-                        pid='__language__',
-                        lid=lid,
-                        code='language'))
-            else:
-                for lang in ds.iter_rows('LanguageTable', 'id', 'name'):
-                    if lang['id'] in langs:
-                        self.languages.setdefault(lang['id'], langs[lang['id']])
-                        self.values.append(Value(
-                            v='y',
-                            pid='__language__',
-                            lid=lang['id'],
-                            code='language'))
+            for lid, lang in langs.items():
+                self.languages.setdefault(lid, lang)
+                self.store.add(v='y', pid='__language__', lid=lid, code='language')
 
+        # Parameters with codes and (non-numeric) language properties are categorical:
+        self.store.freeze(categorical=set(codes).union(language_properties))
+        for language_property in language_properties:
+            domain = self.store.domains[language_property]
+            if not domain.numeric_type:
+                # Non-numeric language properties are categorical, ordered by frequency:
+                codes[language_property] = collections.OrderedDict(
+                    (v, v) for v in sorted(domain.counts, key=lambda vv: -domain.counts[vv]))
         for i, p in enumerate(self.parameters.values()):
+            p.value_to_code = self.store.value_to_code.get(p.id, {})
             if p.id in codes:
                 p.domain = codes[p.id]
             else:
-                vals = [v for v in self.values if v.pid == p.id]
-                if all(v.float is not None for v in vals) and \
-                        (len(set(v.v for v in vals)) > 8 or  # noqa: W504
-                         (datatypes and datatypes[i] == 'number')):
-                    p.type = CONTINUOUS
-                    p.domain = (min(v.float for v in vals), max(v.float for v in vals))
-                else:
-                    counts = collections.Counter([vv.v for vv in vals])
-                    p.domain = collections.OrderedDict([
-                        (v, v)
-                        for v in sorted(set(vv.v for vv in vals), key=lambda vv: -counts[vv])])
+                self.store.domains[p.id].finalize(
+                    p, datatypes[i] if datatypes and i < len(datatypes) else None)
 
     def __str__(self):  # pragma: no cover
         return str(self.parameters)
 
+    @property
+    def values(self) -> typing.List[Value]:
+        """
+        The datapoints as list of `Value` objects.
+
+        Note: The list - and a `Value` object for each datapoint - is created anew on each access,
+        i.e. this is O(N) in time and memory. Use `iter_languages` to process datapoints per
+        language.
+        """
+        return list(self.store)
+
+    @property
+    def index(self) -> typing.Dict[str, typing.Tuple[typing.List[int], typing.List[tuple]]]:
+        """
+        Maps language IDs to pairs of
+
+        - the row numbers in `self.store` of the datapoints for the language, ordered by parameter
+          and value,
+        - triples `(pid, start, end)`, specifying the slice of these rows for each parameter in
+          `self.parameters`.
+
+        The index is built once - in one pass over the datapoints - on first access, and then
+        re-used for subsequent calls of `iter_languages`.
+        """
+        if self._index is None:
+            store, index = self.store, {}
+            for i, (lid, pid) in enumerate(zip(store.lang.tolist(), store.param.tolist())):
+                index.setdefault(lid, {}).setdefault(pid, []).append(i)
+            pids = [(pid, store.pids.ids.get(pid)) for pid in self.parameters]
+            vals = [store.vals[i] for i in store.value.tolist()]
+            self._index = collections.OrderedDict()
+            # Sorting the (few) distinct IDs keeps the order of languages and values stable:
+            for lid in sorted(index, key=lambda i: store.lids[i]):
+                rows, slices = [], []
+                for pid, i in pids:
+                    start = len(rows)
+                    rows.extend(sorted(index[lid].get(i, []), key=vals.__getitem__))
+                    slices.append((pid, start, len(rows)))
+                self._index[store.lids[lid]] = (rows, slices)
+        return self._index
+
     def iter_languages(self) \
             -> typing.Iterator[typing.Tuple[Language, typing.Dict[str, typing.List[Value]]]]:
-        for lid, values in itertools.groupby(sorted(self.values), lambda v: v.lid):
-            values = {pid: list(vals) for pid, vals in itertools.groupby(values, lambda v: v.pid)}
-            values = collections.OrderedDict(
-                [(pid, values.get(pid, [])) for pid in self.parameters])
-            if self.include_missing or all(bool(v) for v in values.values()):
-                yield self.languages[lid], values
+        """
+        Iterate over languages with their datapoints, grouped by parameter.
+
+        Datapoints are stored column-wise (see `ValueStore`); `Value` objects are only created for
+        the language at hand.
+        """
+        if self.store.spilled:
+            for lid, vals in self._iter_spilled():
+                values = collections.OrderedDict(
+                    [(pid, vals.get(pid, [])) for pid in self.parameters])
+                if self.include_missing or all(bool(v) for v in values.values()):
+                    yield self.languages[lid], values
+            return
+
+        make_values = self.store.value_factory()
+        for lid, (rows, slices) in self.index.items():
+            if self.include_missing or all(start < end for _, start, end in slices):
+                values = make_values(rows)
+                yield self.languages[lid], collections.OrderedDict(
+                    [(pid, values[start:end]) for pid, start, end in slices])
+
+    def _iter_spilled(self):
+        for lid, vals in self.store.iter_languages():
+            values = collections.defaultdict(list)
+            for v in sorted(vals, key=lambda v: v.v):
+                values[v.pid].append(v)
+            yield lid, values
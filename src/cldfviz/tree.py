@@ -11,7 +11,7 @@ from pycldf.trees import Tree
 from newick import RESERVED_PUNCTUATION, Node
 from clldutils.svg import pie, icon
 
-from cldfviz.colormap import get_shape_and_color, SVG_SHAPE_MAP
+from cldfviz.colormap import get_shape_and_color, hashable, MARKER_CACHE, SVG_SHAPE_MAP
 
 __all__ = ['render']
 
@@ -60,16 +60,22 @@ class SVGTree:
         return ee
 
     @staticmethod
-    def marker(parent, weighted_colors):
+    def _marker(weighted_colors):
         res = get_shape_and_color(weighted_colors)
         if res:
+            return True, icon(res[1].replace('#', SVG_SHAPE_MAP[res[0]]))
+        ratios, colors = [c[0] for c in weighted_colors], [c[1] for c in weighted_colors]
+        return False, pie(ratios, colors, width=20, stroke_circle=True)
+
+    @staticmethod
+    def marker(parent, weighted_colors):
+        scaled, markup = MARKER_CACHE.get(
+            ('svg', hashable(weighted_colors)), lambda: SVGTree._marker(weighted_colors))
+        if scaled:
             g = ElementTree.SubElement(parent, 'g')
             g.attrib['transform'] = 'scale(0.5)'
             parent = g
-            p = ElementTree.fromstring(icon(res[1].replace('#', SVG_SHAPE_MAP[res[0]])))
-        else:
-            ratios, colors = [c[0] for c in weighted_colors], [c[1] for c in weighted_colors]
-            p = ElementTree.fromstring(pie(ratios, colors, width=20, stroke_circle=True))
+        p = ElementTree.fromstring(markup)
         parent.extend(p.findall('./{}path'.format('{http://www.w3.org/2000/svg}')))
         parent.extend(p.findall('./{}circle'.format('{http://www.w3.org/2000/svg}')))
 
@@ -243,6 +249,8 @@ def add_legend(svg, data):
                 'text', row_, x=180, y=15, text=str(max_), text_anchor='end', stroke_width=0)
             y += 25
             row_ = svg.element('g', legend, transform="translate(10,{})".format(y))
+            colors = data.colormaps[pid].map_array(
+                [min_ + j * (max_ - min_) / 10 for j in range(10)])
             for i in range(10):
                 svg.element(
                     'rect',
@@ -250,7 +258,7 @@ def add_legend(svg, data):
                     x=i * 18,
                     y=0,
                     width='18', height='18',
-                    fill=data.colormaps[pid](min_ + i * (max_ - min_) / 10))
+                    fill=colors[i])
             y += 25
         else:
             for v, label in parameter.domain.items():
@@ -1,4 +1,7 @@
+import re
+import json
 import shlex
+import argparse
 import logging
 import pathlib
 import warnings
@@ -113,6 +116,21 @@ def test_tree(ds_arg, tmp_path, capsys, args, expect):
         assert expect(out)
 
 
+@pytest.mark.parametrize('links', [True, False])
+def test_tree_glottolog_links(ds_arg, glottolog_dir, capsys, links):
+    from cldfviz.glottolog import Glottolog
+
+    runcli('cldfviz.tree', '--test --tree-dataset {} --glottolog {}{}'.format(
+        ds_arg, glottolog_dir, ' --glottolog-links' if links else ''))
+    out, _ = capsys.readouterr()
+    assert ('https://glottolog.org/resource/languoid/id/' in out) == links
+    # Only the languoids linked from the tree (if any) have been read:
+    gl = Glottolog.from_args(argparse.Namespace(
+        glottolog=glottolog_dir, glottolog_cldf=None, cache_dir=None))
+    assert not gl.data._complete
+    assert bool(gl.data._languoids) == links
+
+
 @pytest.mark.skipif(not WITH_CARTOPY, reason="Cannot run without cartopy.")
 @pytest.mark.parametrize(
     'with_full_dataset,opts,expect',
@@ -166,6 +184,12 @@ def test_treemap(
                 out,
                 opts))
     assert expect(out.read_text(encoding='utf8'))
+    if '--glottolog' in opts and not with_full_dataset:
+        # Glottolog is read lazily - not in full:
+        from cldfviz.glottolog import _INSTANCES
+        for key, gl in _INSTANCES.items():
+            if key[1] == str(glottolog_dir) and hasattr(gl.data, '_complete'):
+                assert not gl.data._complete
 
 
 def test_examples(ds_arg, tmp_path, capsys):
@@ -365,6 +389,59 @@ def test_map_misc(tmp_path, capsys, ds_arg, md_path_factory, MetadataFreeStructu
             run(ds_arg, '--format jpg --parameters C --output {}'.format(tmp_path / 'test.jpg'))
 
 
+def test_map_leaflet_icons(ds_arg, tmp_path, glottolog_dir):
+    out = tmp_path / 'map.html'
+    runcli(
+        'cldfviz.map',
+        '{} --test --format html --output {} --glottolog {} --parameters C'.format(
+            ds_arg, out, glottolog_dir))
+    html = out.read_text(encoding='utf8')
+    icons = json.loads(re.search(r'var icons = (.+);\n', html).group(1))
+    features = json.loads(re.search(r'var geojson = (.+);\n', html).group(1))['features']
+    # Each distinct icon is embedded once, and referenced by index:
+    assert len(icons) == len(set(icons)) < len(features)
+    assert {f['properties']['icon'] for f in features} == set(range(len(icons)))
+    assert all(icon.startswith('data:image/svg+xml') for icon in icons)
+
+
+def test_map_leaflet_streamed(ds_arg, tmp_path, glottolog_dir):
+    out = tmp_path / 'map.html'
+    runcli('cldfviz.map', '{} --test --format html --output {} --glottolog {} --parameters C '
+                          '--coordinate-precision 1 --overlay-geojson ecoregions'.format(
+                              ds_arg, out, glottolog_dir))
+    html = out.read_text(encoding='utf8')
+    assert not re.search(r'\$[a-z_]+', html)  # All template variables are filled.
+    geojson = re.search(r'var geojson = (.+);\n', html).group(1)
+    assert '", "' not in geojson  # Compact separators.
+    for f in json.loads(geojson)['features']:
+        assert all(round(c, 1) == c for c in f['geometry']['coordinates'])
+    assert json.loads(re.search(r'var overlay_geojson = (.+);\n', html).group(1))
+    assert 'ECO_NAME' in html
+
+
+@pytest.mark.parametrize('mode', ['canvas', 'clusters'])
+def test_map_leaflet_render_mode(ds_arg, tmp_path, glottolog_dir, mode):
+    out = tmp_path / 'map.html'
+    runcli('cldfviz.map', '{} --test --format html --output {} --glottolog {} --parameters B,C '
+                          '--render-mode {}'.format(ds_arg, out, glottolog_dir, mode))
+    html = out.read_text(encoding='utf8')
+    assert '"render_mode": "{}"'.format(mode) in html
+    icons = json.loads(re.search(r'var icons = (.+);\n', html).group(1))
+    # Canvas markers are described by shape and colors:
+    assert all(icon[0] is None and sum(w for w, _ in icon[1]) == pytest.approx(1)
+               for icon in icons)
+    features = json.loads(re.search(r'var geojson = (.+);\n', html).group(1))['features']
+    clusters = json.loads(re.search(r'var clusters = (.+);\n', html).group(1))
+    if mode == 'clusters':
+        assert clusters and all('minzoom' in f['properties'] for f in features)
+    else:
+        assert clusters == []
+
+    with pytest.raises(SystemExit):
+        runcli('cldfviz.map', '{} --test --format html --output {} --parameters B '
+                              '--render-mode clusters --with-layers'.format(ds_arg, out))
+
+
 @pytest.mark.skipif(not WITH_CARTOPY, reason="Cannot run without cartopy.")
 @pytest.mark.parametrize(
     'with_full_dataset,opts,expect_html,expect_svg',
@@ -1,6 +1,9 @@
 import argparse
 
+import pytest
+
 from cldfviz import cli_util
+from cldfviz.glottolog import Glottolog
 
 
 def test_tree(tmp_path):
@@ -11,3 +14,111 @@ def test_tree(tmp_path):
     args = parser.parse_args(['--tree', str(nwk)])
     res = cli_util.get_tree(args)
     assert res[0].name == 'd'
+
+
+def test_get_multiparameter_cached(StructureDataset, tmp_path, mocker):
+    parser = argparse.ArgumentParser()
+    cli_util.add_multiparameter(parser, with_language_filter=True)
+    args = parser.parse_args(
+        ['--parameters', 'B', '--cache-dir', str(tmp_path / 'cache'),
+         '--language-filters', '{"Filtered":"False"}'])
+    data, _ = cli_util.get_multiparameter(args, StructureDataset, None)
+    assert len(list(tmp_path.joinpath('cache').glob('multiparameter-*.pickle'))) == 1
+
+    mocker.patch('cldfviz.cli_util.MultiParameter', mocker.Mock(side_effect=ValueError))
+    args.colormaps = []
+    cached, _ = cli_util.get_multiparameter(args, StructureDataset, None)
+    assert list(cached.languages) == list(data.languages)
+    assert cached.parameters['B'].domain == data.parameters['B'].domain
+
+    # A different filter results in a different cache key:
+    args.language_filters = '{"Filtered":"True"}'
+    with pytest.raises(ValueError):
+        cli_util.get_multiparameter(args, StructureDataset, None)
+
+
+def test_get_multiparameter_cache_key(StructureDataset, tmp_path, mocker):
+    parser = argparse.ArgumentParser()
+    cli_util.add_multiparameter(parser)
+    args = parser.parse_args(['--parameters', 'B', '--cache-dir', str(tmp_path)])
+    glottolog = mocker.NonCallableMock(cache_key=['api', 'glottolog', 'v4.8'])
+    glottolog.__contains__ = mocker.Mock(return_value=False)
+
+    def pickles():
+        return sorted(p.name for p in tmp_path.glob('multiparameter-*.pickle'))
+
+    cli_util.get_multiparameter(args, StructureDataset, glottolog)
+    assert len(pickles()) == 1
+    # Other Glottolog data, ...
+    glottolog.cache_key = ['api', 'glottolog', 'v5.0']
+    cli_util.get_multiparameter(args, StructureDataset, glottolog)
+    assert len(pickles()) == 2
+    # ... or another cldfviz version result in a different cache key:
+    mocker.patch('cldfviz.__version__', '0.0')
+    cli_util.get_multiparameter(args, StructureDataset, glottolog)
+    assert len(pickles()) == 3
+
+
+def test_get_multiparameter_cached_glottolog(StructureDataset, glottolog_dir, tmp_path, mocker):
+    parser = argparse.ArgumentParser()
+    cli_util.add_multiparameter(parser)
+    Glottolog.add(parser)
+    args = parser.parse_args(
+        ['--parameters', 'B', '--glottolog', str(glottolog_dir), '--cache-dir', str(tmp_path)])
+    load = mocker.Mock(side_effect=Glottolog.from_args)
+    mocker.patch.dict('cldfviz.glottolog._INSTANCES', clear=True)
+    cli_util.get_multiparameter(args, StructureDataset, load)
+    assert load.call_count == 1
+
+    # Re-running - in a new process - does not load Glottolog:
+    mocker.patch.dict('cldfviz.glottolog._INSTANCES', clear=True)
+    args.colormaps = []
+    cli_util.get_multiparameter(args, StructureDataset, load)
+    assert load.call_count == 1
+
+
+def test_get_multiparameter_corrupt_cache(StructureDataset, tmp_path):
+    parser = argparse.ArgumentParser()
+    cli_util.add_multiparameter(parser)
+    args = parser.parse_args(['--parameters', 'B', '--cache-dir', str(tmp_path)])
+    data, _ = cli_util.get_multiparameter(args, StructureDataset, None)
+    p = next(tmp_path.glob('multiparameter-*.pickle'))
+    p.write_bytes(p.read_bytes()[:20])
+    args.colormaps = []
+    res, _ = cli_util.get_multiparameter(args, StructureDataset, None)
+    assert list(res.languages) == list(data.languages)
+    # The cache entry has been re-written:
+    assert len(p.read_bytes()) > 20
+
+
+@pytest.mark.parametrize(
+    'spec',
+    [
+        '{"Filtered":"False"}',
+        '{"Filtered":"True","Name":"^[A-M]"}',
+        '{"ListFiltered":"c"}',
+        '{"Macroarea":"Eurasia","Family_name":"Indo"}',
+        '{"Filtered":true}',
+    ]
+)
+def test_LanguageFilter(StructureDataset, spec):
+    lf = cli_util.get_language_filter(argparse.Namespace(language_filters=spec))
+    assert lf is cli_util.get_language_filter(argparse.Namespace(language_filters=spec))
+    expected = {lg.id for lg in StructureDataset.objects('LanguageTable') if lf(lg)}
+    assert expected
+    assert lf.select(StructureDataset) == expected
+    assert {
+        r['ID'] for r in StructureDataset['LanguageTable'] if lf(r)} == expected
+    selection = cli_util.get_filtered_languages(
+        argparse.Namespace(language_filters=spec), StructureDataset)
+    assert list(selection) == [
+        lg.id for lg in StructureDataset.objects('LanguageTable') if lg.id in expected]
+
+
+def test_LanguageSelection():
+    sel = cli_util.LanguageSelection(['b', 'a', 'b', 'c'])
+    assert list(sel) == ['b', 'a', 'c'] and len(sel) == 3
+    assert 'a' in sel and 'x' not in sel
+    assert isinstance(sel & {'a', 'c', 'x'}, cli_util.LanguageSelection)
+    assert list(sel & ['c', 'a', 'x']) == ['a', 'c']
+    assert sel == {'a', 'b', 'c'}
@@ -2,7 +2,7 @@ import itertools
 
 import pytest
 
-from cldfviz.multiparameter import Parameter, Value
+from cldfviz.multiparameter import Parameter, Value, CATEGORICAL, CONTINUOUS
 from cldfviz.colormap import *
 
 
@@ -85,3 +85,50 @@ def test_weighted_colors(values, count):
     res = weighted_colors(values, colormaps)
     assert len(res) == count
     assert sum(c[0] for c in res) == pytest.approx(1.0)
+
+
+def test_Colormap_map_array():
+    import numpy as np
+
+    cm = Colormap(Parameter(id='x', name='y', domain=(1, 5)), novalue='red')
+    res = cm.map_array(np.array([1, 2, None, 5], dtype=object))
+    assert res.tolist() == [cm(1), '#0080ff', '#FF0000', cm(5)]
+    assert cm.map_array(np.linspace(0, 6, 50)).tolist() == [cm(v) for v in np.linspace(0, 6, 50)]
+
+    cm = Colormap(Parameter(id='x', name='y', domain={'a': 1, 'b': 2}), name='tol')
+    assert cm.map_array(['b', 'a', 'b']).tolist() == [cm('b'), cm('a'), cm('b')]
+    assert cm.map_array([]).tolist() == []
+
+
+def test_MarkerCache():
+    cache = MarkerCache(maxsize=2)
+    assert cache.get('a', lambda: 1) == 1
+    assert cache.get('a', lambda: 2) == 1
+    assert cache.get('b', lambda: 2) == 2
+    assert cache.get('c', lambda: 3) == 3
+    assert cache.get('a', lambda: 4) == 4, 'least recently used item was evicted'
+    assert cache.get(['unhashable'], lambda: 5) == 5
+    assert cache.cache_info() == (1, 5, 2, 2)
+    cache.clear()
+    assert cache.cache_info().currsize == 0
+
+
+def test_weighted_colors_cached():
+    cm = Colormap(Parameter(id='x', name='y', domain={'a': 1, 'b': 2}), name='tol')
+    MARKER_CACHE.clear()
+    res = weighted_colors({'x': [_make_value('a', 'x'), _make_value('b', 'x')]}, {'x': cm})
+    assert weighted_colors({'x': [_make_value('b', 'x'), _make_value('a', 'x')]}, {'x': cm}) == res
+    assert MARKER_CACHE.cache_info().hits == 1
+
+    # The same value with and without weight:
+    res = weighted_colors(
+        {'x': [_make_value('a', 'x', weight=0.5), _make_value('a', 'x'), _make_value('b', 'x')]},
+        {'x': cm})
+    assert [w for w, _ in res] == pytest.approx([0.6, 0.4])
+
+
+def test_COLORMAPS():
+    assert 'tol' in COLORMAPS[CATEGORICAL]
+    assert 'viridis' in COLORMAPS[CONTINUOUS]
+    assert 'viridis_r' not in COLORMAPS[CONTINUOUS]
+    assert len(dict(COLORMAPS)) == 2
@@ -0,0 +1,139 @@
+import zipfile
+import concurrent.futures
+
+import pytest
+
+from pycldf import Dataset
+
+from cldfviz.dsutils import (
+    iter_rows, row_boundaries, tree_offsets, read_tree, TREE_INDEX, get_dataset,
+)
+
+
+def test_iter_rows(StructureDataset):
+    rows = list(iter_rows(
+        StructureDataset, 'ValueTable', 'languageReference', 'value', 'Source',
+        filters={'parameterReference': {'B'}}))
+    expected = [
+        r for r in StructureDataset.iter_rows(
+            'ValueTable', 'languageReference', 'parameterReference', 'value')
+        if r['parameterReference'] == 'B']
+    assert len(rows) == len(expected)
+    for row, exp in zip(rows, expected):
+        assert row['languageReference'] == row['Language_ID'] == exp['languageReference']
+        assert row['value'] == exp['value']
+        assert row['Source'] == exp['Source']
+    assert not list(iter_rows(StructureDataset, 'ValueTable', filters={'parameterReference': {}}))
+
+
+def test_iter_rows_zipped(StructureDataset, tmp_path):
+    StructureDataset.copy(tmp_path)
+    ds = Dataset.from_metadata(tmp_path / 'StructureDataset-metadata.json')
+    n = len(list(iter_rows(ds, 'ValueTable', 'id', filters={'parameterReference': {'B', 'C'}})))
+    assert n
+
+    fname = tmp_path / 'values.csv'
+    with zipfile.ZipFile(str(fname) + '.zip', 'w') as zf:
+        zf.write(fname, arcname=fname.name)
+    fname.unlink()
+    assert len(list(
+        iter_rows(ds, 'ValueTable', 'id', filters={'parameterReference': {'B', 'C'}}))) == n
+
+
+def test_iter_rows_parallel(tmp_path, mocker):
+    values = tmp_path / 'values.csv'
+    rows = ['ID,Language_ID,Parameter_ID,Value']
+    for i in range(200):
+        rows.append('{0},l{1},{2},"{3}"'.format(
+            i, i % 7, 'p' if i % 3 else 'q', 'multi\nline ""{}""'.format(i) if i % 5 else i))
+    values.write_text('\n'.join(rows), encoding='utf8')
+    ds = Dataset.from_data(values)
+
+    bounds = row_boundaries(values, 4)
+    assert len(bounds) == 5 and bounds[-1] == values.stat().st_size
+
+    kw = dict(filters={'parameterReference': {'p'}})
+    expected = list(iter_rows(ds, 'ValueTable', 'id', 'value', **kw))
+    assert len(expected) == 133
+    assert list(iter_rows(ds, 'ValueTable', 'id', 'value', jobs=3, **kw)) == expected
+
+    # With many chunks, only a bounded number of chunks is read ahead:
+    submitted = []
+
+    class Executor(concurrent.futures.ThreadPoolExecutor):
+        def submit(self, *args, **kw):
+            submitted.append(args)
+            return super().submit(*args, **kw)
+
+    mocker.patch('cldfviz.dsutils.CHUNK_SIZE', 100)
+    mocker.patch('cldfviz.dsutils.concurrent.futures.ProcessPoolExecutor', Executor)
+    rows = iter_rows(ds, 'ValueTable', 'id', 'value', jobs=2, **kw)
+    assert next(rows) == expected[0]
+    assert len(submitted) == 4
+    assert [expected[0]] + list(rows) == expected
+    assert len(submitted) > 20
+
+
+@pytest.mark.parametrize(
+    'mimetype,content',
+    [
+        ('text/x-nh', "((a:1,b:2)c,d);\n(a,(b,c));\n\n(x,y)z;\n"),
+        ('text/plain',
+         "#NEXUS\nBEGIN TAXA;\n  DIMENSIONS NTAX=3;\nEND;\n"
+         "BEGIN TREES;\n  TRANSLATE 1 a, 2 b, 3 c;\n"
+         "  TREE t1 = [&R] ((1:1,2:2)[&x=1;y]:3,3:1);\n"
+         "  [a ; comment] tree 'second tree' = ((a,'b;''x'),c);\n"
+         "  tree t3=(a,b);\n"
+         "END;\n"),
+    ]
+)
+def test_read_tree(tmp_path, mocker, mimetype, content):
+    from pycldf import Generic
+    from pycldf.trees import TreeTable
+
+    tmp_path.joinpath('trees.txt').write_text(content, encoding='utf8')
+    ds = Generic.in_dir(tmp_path)
+    ds.add_component('MediaTable')
+    ds.add_component('TreeTable')
+    names = ['1', '2', '3'] if mimetype == 'text/x-nh' else ['t1', 'second tree', 't3']
+    ds.write(
+        MediaTable=[dict(ID='m', Media_Type=mimetype, Download_URL='trees.txt')],
+        TreeTable=[dict(ID=str(i), Name=n, Media_ID='m') for i, n in enumerate(names)])
+
+    trees = list(TreeTable(ds))
+    assert sorted(tree_offsets(trees[0])) == sorted(names)
+    assert tmp_path.joinpath(TREE_INDEX).exists()
+    for tree in trees:
+        assert read_tree(tree).newick == tree.newick().newick
+        assert read_tree(tree, strip_comments=True).newick == \
+            tree.newick(strip_comments=True).newick
+
+    # The persisted index is re-used - and updated when the tree file changes:
+    from cldfviz import dsutils
+    dsutils._tree_indexes.clear()
+    spy = mocker.spy(dsutils, '_newick_offsets' if mimetype == 'text/x-nh' else '_nexus_offsets')
+    assert tree_offsets(trees[0])
+    assert spy.call_count == 0
+    tmp_path.joinpath('trees.txt').write_text(content + '\n', encoding='utf8')
+    assert tree_offsets(trees[0])
+    assert spy.call_count == 1
+
+
+def test_get_dataset(tmp_path):
+    from pycldf import Generic
+
+    ds = Generic.in_dir(tmp_path)
+    ds.add_component('LanguageTable')
+    ds.write(LanguageTable=[dict(ID='l', Name='L')])
+    md = tmp_path / 'Generic-metadata.json'
+
+    ds1 = get_dataset(str(md))
+    assert get_dataset(str(md)) is ds1
+    # Different locators resolving to the same metadata share the dataset:
+    assert get_dataset(str(tmp_path)) is ds1
+
+    # Changing the metadata invalidates the registered dataset:
+    md.write_text(md.read_text(encoding='utf8') + '\n', encoding='utf8')
+    ds2 = get_dataset(str(md))
+    assert ds2 is not ds1
+    assert get_dataset(str(tmp_path)) is ds2
@@ -1,5 +1,6 @@
 import argparse
 
+import numpy as np
 import pytest
 
 from cldfviz.glottolog import *
@@ -22,6 +23,12 @@ def glottolog_cldf(glottolog_dir, tmp_path):
             Parameter_ID='subclassification',
             Value=lang.newick_node(template="{l.id}").newick,
         ))
+        vals.append(dict(
+            ID=lang.id + '-c',
+            Language_ID=lang.id,
+            Parameter_ID='classification',
+            Value='/'.join(gc for _, gc, _ in lang.lineage),
+        ))
     ds.write(LanguageTable=langs, ValueTable=vals)
     return tmp_path / 'glottolog-cldf'
 
@@ -44,3 +51,100 @@ def test_Glottolog_pyglottolog(glottolog_dir):
     assert 'abcd1234' in gl
     assert len(gl) == 8
     assert gl.newick('abcd1234')
+
+
+@pytest.mark.parametrize('backend', ['api', 'cldf'])
+def test_Glottolog_cache_dir(backend, glottolog_dir, glottolog_cldf, tmp_path, mocker):
+    parser = argparse.ArgumentParser()
+    Glottolog.add(parser)
+    args = parser.parse_args([
+        '--glottolog' if backend == 'api' else '--glottolog-cldf',
+        str(glottolog_dir if backend == 'api' else glottolog_cldf),
+        '--cache-dir', str(tmp_path / 'cache')])
+    gl = Glottolog.from_args(args)
+    assert isinstance(gl.data, LanguoidIndex)
+    assert len(list(tmp_path.joinpath('cache').glob('glottolog-*.sqlite'))) == 1
+    eager = Glottolog(gl.api)
+    assert len(gl) == len(eager) == 8
+    assert set(gl) == set(eager)
+    lg, lg_eager = gl['abcd1234'], eager['abcd1234']
+    assert lg.name == lg_eager.name
+    assert (lg.lat, lg.lon) == pytest.approx((float(lg_eager.lat), float(lg_eager.lon)))
+    if backend == 'api':
+        assert lg.lineage == lg_eager.lineage
+    assert 'xxxx1234' not in gl
+    with pytest.raises(KeyError):
+        _ = gl['xxxx1234']
+
+    # The index is re-used:
+    mocker.patch.object(Glottolog, 'iter_languoids', side_effect=ValueError)
+    assert len(Glottolog.from_args(args)) == 8
+
+
+@pytest.mark.parametrize('backend', ['api', 'cldf'])
+def test_Glottolog_lazy(backend, glottolog_dir, glottolog_cldf):
+    from pycldf import Dataset
+    import pyglottolog
+
+    api = pyglottolog.Glottolog(glottolog_dir) if backend == 'api' \
+        else Dataset.from_metadata(glottolog_cldf / 'StructureDataset-metadata.json')
+    gl, eager = Glottolog(api, lazy=True), Glottolog(api)
+    assert isinstance(gl.data, LazyLanguoids)
+    gl.prefetch(['abcd1234', 'xxxx1234', None])
+    assert set(gl.data._languoids) == {'abcd1234', 'xxxx1234'}
+    assert gl['abcd1234'] == eager['abcd1234']
+    assert 'xxxx1234' not in gl
+    assert None not in gl
+    assert not gl.data._complete
+    assert len(gl) == 8
+    assert set(gl) == set(eager)
+
+
+@pytest.mark.parametrize('backend', ['api', 'cldf'])
+def test_Glottolog_newick(backend, glottolog_dir, glottolog_cldf):
+    from pycldf import Dataset
+    import pyglottolog
+
+    api = pyglottolog.Glottolog(glottolog_dir) if backend == 'api' \
+        else Dataset.from_metadata(glottolog_cldf / 'StructureDataset-metadata.json')
+    gl = Glottolog(api, lazy=True)
+    nwk = gl.newick('abcd1234')
+    nwk.name = 'changed'
+    assert gl.newick('abcd1234').name == 'abcd1234', 'cached tree must not be modified'
+    for gc in gl:
+        assert gl.subtree(gc).newick == gl.newick(gc).newick
+        assert gl.subtree(gc).ancestor is None
+    assert gl.family('abcd1236') == gl.family('abcd1234') == 'abcd1234'
+    assert gl.subtree('xxxx1234') is None
+
+
+def test_Glottolog_from_args_shared(glottolog_dir):
+    parser = argparse.ArgumentParser()
+    Glottolog.add(parser)
+    args = parser.parse_args(['--glottolog', str(glottolog_dir)])
+    assert Glottolog.from_args(args) is Glottolog.from_args(args)
+
+
+def test_CoordinateTable():
+    table = CoordinateTable([
+        Languoid(id='a', name='A', lat=10, lon=179),
+        Languoid(id='b', name='B', lat=-10, lon=-179),
+        Languoid(id='c', name='C', lat=None, lon=None),
+    ])
+    assert len(table) == 3 and 'c' in table
+    assert table.rows(['b', 'x']).tolist() == [1, -1]
+    coords = table.lookup(['a', 'x', 'c'])
+    assert coords['lat'][0] == 10 and coords['lon'][0] == 179
+    assert np.isnan(coords['lat'][1]) and np.isnan(coords['lat'][2])
+    lat, lon = table.centroid(['a', 'b', 'c'])
+    assert lat == pytest.approx(0, abs=1e-9) and abs(lon) == pytest.approx(180)
+    assert table.centroid(['a', 'x']) == (10, 179)
+    assert table.centroid(['c', 'x']) is None
+
+
+def test_Glottolog_coordinates(glottolog):
+    assert len(glottolog.coordinates()) == 8
+    assert glottolog.coordinates() is glottolog.coordinates(['abcd1234'])
+    table = Glottolog(glottolog.api, lazy=True).coordinates(['abcd1234', 'xxxx1234'])
+    assert len(table) == 1
+    assert table.lookup(['abcd1234'])['lon'].tolist() == [4]
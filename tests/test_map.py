@@ -1 +1,41 @@
-#
+import json
+import argparse
+
+from cldfviz.map.leaflet import grid_clusters, MapLeaflet
+from cldfviz.multiparameter import Language, Value
+
+
+def test_grid_clusters():
+    lonlats = [(10, 10), (10.001, 10.001), (10.5, 10.5), (-100, -30), (-100, -30)]
+    minzoom, clusters = grid_clusters(lonlats, max_zoom=10)
+    assert minzoom[3] == minzoom[4] == 11  # Identical coordinates are never split up.
+    assert minzoom[0] == minzoom[1] > minzoom[2] > 0
+    assert len(clusters) == 11
+    # At zoom 0, the nearby points form one cluster:
+    lat, lon, count, south, west, north, east = sorted(clusters[0], key=lambda c: -c[2])[0]
+    assert count == 3 and (south, west, north, east) == (10, 10, 10.5, 10.5)
+    assert 10 < lat < 10.5 and 10 < lon < 10.5
+    # Points are displayed either individually or as part of exactly one cluster:
+    for zoom, level in enumerate(clusters):
+        assert sum(c[2] for c in level) + sum(1 for z in minzoom if z <= zoom) == len(lonlats)
+
+    assert grid_clusters([(0, 0), (90, 0)], max_zoom=5) == ([0, 0], [])
+
+
+def test_MapLeaflet_features():
+    args = argparse.Namespace(
+        value_template='{parameter}: {code}', markersize=10, pacific_centered=False,
+        coordinate_precision=None, render_mode='clusters',
+        with_layers=False, with_layers_for_combinations=False)
+    m = MapLeaflet([], args)
+    for i in range(3):
+        m.add_language(
+            Language(dict(id=str(i), name='L', latitude=1.0, longitude=2.0)),
+            {'p': [Value(v='a', pid='p', lid=str(i), code='a')]},
+            {'p': lambda v: '#ff0000'})
+    # Features are written to disk right away, only coordinates are kept in memory:
+    assert m._features.tell() > 0 and not hasattr(m, 'features')
+    assert list(m._lonlats) == [2.0, 1.0] * 3
+    features = [json.loads(f) for f in m._iter_features(minzoom=[0, 1, 2])]
+    assert [f['properties']['minzoom'] for f in features] == [0, 1, 2]
+    assert len(m.icons) == 1
@@ -1,9 +1,14 @@
 import argparse
+import itertools
+import collections
 
 import pytest
 from pycldf import Dataset
 
-from cldfviz.multiparameter import MultiParameter, Language, Value, CONTINUOUS
+from cldfviz.multiparameter import (
+    MultiParameter, Language, Value, ValueStore, Domain, Parameter, CONTINUOUS, CATEGORICAL,
+    geolocate,
+)
 from cldfviz.cli_util import get_language_filter
 
 
@@ -65,3 +70,194 @@ def test_Value():
     v1 = Value(v=1, pid=1, lid=1, code=1)
     assert v1 == Value(v=1, pid=1, lid=1, code=2)
     assert Value(v=2, pid=2, lid=1, code=2) < Value(v=1, pid=1, lid=2, code=1)
+    assert Value(v='1.5', pid=1, lid=1, code=1).float == pytest.approx(1.5)
+    assert Value(v='x', pid=1, lid=1, code=1).float is None
+    assert Value(v='1.5', pid=1, lid=1, code=1, float=2.5).float == pytest.approx(2.5)
+
+
+def test_ValueStore():
+    store = ValueStore()
+    store.add(v='1.5', pid='p', lid='l1', code=None, weight=2)
+    store.add(v='x', pid='p', lid='l2', code='c')
+    store.add(v='x', pid='q', lid='l2', code='c')
+    store.freeze()
+    assert len(store) == 3
+    assert len(store.vals) == 2
+    assert store.pid_mask('p').sum() == 2
+    assert not store.pid_mask('z').any()
+    assert store.float[0] == pytest.approx(1.5)
+    v = store.get(1)
+    assert (v.v, v.lid, v.code, v.weight, v.float) == ('x', 'l2', 'c', None, None)
+    assert store.get(0).weight == pytest.approx(2.0)
+    assert [(v.v, v.pid, v.lid, v.code, v.float, v.weight) for v in store] == [
+        ('1.5', 'p', 'l1', None, 1.5, 2.0), ('x', 'p', 'l2', 'c', None, None),
+        ('x', 'q', 'l2', 'c', None, None)]
+
+
+def test_MultiParameter_lazy_glottolog(metadatafree_dataset, glottolog):
+    from cldfviz.glottolog import Glottolog
+
+    gl = Glottolog(glottolog.api, lazy=True)
+    mp = MultiParameter(metadatafree_dataset, ['param1'], glottolog=gl)
+    assert 'abcd1234' in mp.languages
+    # Only the Glottocodes in the dataset have been looked up:
+    assert not gl.data._complete
+
+
+def test_MultiParameter_index(StructureDataset):
+    mp = MultiParameter(StructureDataset, ['B', 'C'])
+    index = mp.index
+    assert mp.index is index
+    lid, (rows, slices) = next(iter(index.items()))
+    assert [pid for pid, _, _ in slices] == ['B', 'C']
+    assert slices[-1][2] == len(rows)
+    assert [lg.id for lg, _ in mp.iter_languages()] == list(index)
+    assert len(list(mp.iter_languages())) == len(list(mp.iter_languages()))
+
+
+def test_MultiParameter_iter_languages_repeated(tmp_path):
+    import timeit
+
+    from pycldf import StructureDataset
+
+    # The usual layout of a ValueTable: Sorted by language, with values for many parameters.
+    ds = StructureDataset.in_dir(tmp_path)
+    ds.add_component('LanguageTable')
+    ds.write(
+        LanguageTable=[dict(ID='l{:04}'.format(i), Name='L', Latitude=0, Longitude=0)
+                       for i in range(500)],
+        ValueTable=[
+            dict(ID=str(i), Language_ID='l{:04}'.format(i // 20), Parameter_ID='p{}'.format(i % 20),
+                 Value=str(i % 7) if i % 2 else 'v{}'.format(i % 5))
+            for i in range(10000)])
+    mp = MultiParameter(ds, ['p{}'.format(i) for i in range(20)])
+    values = mp.values
+
+    def grouped():
+        # What iter_languages used to do: Sort and group a list of all Value objects.
+        for lid, vals in itertools.groupby(sorted(values), lambda v: v.lid):
+            vals = {pid: list(vv) for pid, vv in itertools.groupby(vals, lambda v: v.pid)}
+            yield mp.languages[lid], collections.OrderedDict(
+                [(pid, vals.get(pid, [])) for pid in mp.parameters])
+
+    def as_list(items):
+        return [(lg.id, [(pid, [v.v for v in vals]) for pid, vals in values.items()])
+                for lg, values in items]
+
+    assert as_list(mp.iter_languages()) == as_list(grouped())
+    # Once the index is built, iterating is faster than sorting - even pre-built Value objects:
+    assert min(timeit.repeat(lambda: list(mp.iter_languages()), number=1, repeat=5)) < \
+        min(timeit.repeat(lambda: list(grouped()), number=1, repeat=5))
+
+
+@pytest.mark.parametrize(
+    'values,datatype,type_,domain',
+    [
+        (['1', '2', '1'], None, CATEGORICAL, ['1', '2']),
+        (['1', '2', '1'], 'number', CONTINUOUS, (1.0, 2.0)),
+        ([str(i) for i in range(10)], None, CONTINUOUS, (0.0, 9.0)),
+        (['x', 'y', 'y'], 'number', CATEGORICAL, ['y', 'x']),
+        ([], 'number', CATEGORICAL, []),
+    ]
+)
+def test_Domain(values, datatype, type_, domain):
+    acc, p = Domain(), Parameter(id='p', name='p')
+    for v in values:
+        acc.add(v, ValueStore._float(v))
+    acc.finalize(p, datatype)
+    assert p.type == type_
+    assert (p.domain if isinstance(p.domain, tuple) else list(p.domain)) == domain
+
+
+def test_Language_from_row(glottolog):
+    lang = Language(dict(id='l', name='L', latitude=None, glottocode='abcd1234'), glottolog)
+    assert lang.lat == pytest.approx(10.0)
+    lang = Language(dict(id='l', latitude=None), glottolog)
+    assert lang.lat is None and lang.name is None
+    lang = Language(dict(id='l', glottocode=['abcd1234', 'isol1234', 'xxxx1234']), glottolog)
+    assert lang.lat == pytest.approx(10, abs=0.2) and lang.lon == pytest.approx(-3, abs=0.1)
+
+
+def test_geolocate(glottolog):
+    langs = [
+        (Language(dict(id='1')), 'abcd1237'),
+        (Language(dict(id='2')), ['abcd1235', 'abcd1237']),
+        (Language(dict(id='3')), 'xxxx1234'),
+        (Language(dict(id='4', latitude=1, longitude=1)), 'abcd1237'),
+    ]
+    geolocate(langs, glottolog)
+    assert [(lg.lat, lg.lon) for lg, _ in langs] == [
+        (3.5, -30), pytest.approx((2, -30), abs=0.01), (None, None), (1, 1)]
+
+
+def test_MultiParameter_spilled(StructureDataset):
+    def as_dict(mp):
+        return {
+            lang.id: {pid: [(v.v, v.code) for v in vals] for pid, vals in values.items()}
+            for lang, values in mp.iter_languages()}
+
+    mp = MultiParameter(StructureDataset, ['B', 'C'], language_properties=['Family_name'])
+    spilled = MultiParameter(
+        StructureDataset, ['B', 'C'], language_properties=['Family_name'], memory_budget=500)
+    assert len(spilled.store.runs) > 1
+    assert len(spilled.store) == len(mp.store)
+    assert len(spilled.values) == len(mp.values)
+    assert as_dict(spilled) == as_dict(mp)
+    assert spilled.parameters['C'] == mp.parameters['C']
+    assert spilled.parameters['Family_name'] == mp.parameters['Family_name']
+    # Value-to-code mappings are only retained for categorical parameters:
+    assert spilled.parameters['B'].domain == mp.parameters['B'].domain
+    assert mp.parameters['B'].value_to_code and not spilled.parameters['B'].value_to_code
+
+
+def _values_dataset(d, nrows, numeric=True):
+    from pycldf import StructureDataset
+
+    ds = StructureDataset.in_dir(d)
+    ds.add_component('LanguageTable')
+    ds.write(
+        LanguageTable=[dict(ID='l{}'.format(i), Name='L', Latitude=0, Longitude=0)
+                       for i in range(20)],
+        ValueTable=[
+            dict(ID=str(i), Language_ID='l{}'.format(i % 20), Parameter_ID='p{}'.format(i % 3),
+                 Value=str(i / 2) if numeric else 'form{}'.format(i))
+            for i in range(nrows)])
+    return ds
+
+
+def test_MultiParameter_spilled_memory(tmp_path):
+    import tracemalloc
+
+    def retained(nrows):
+        ds = _values_dataset(tmp_path / str(nrows), nrows)
+        tracemalloc.start()
+        mp = MultiParameter(ds, ['p0', 'p1', 'p2'], memory_budget=50000)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert mp.parameters['p0'].type == CONTINUOUS and not mp.parameters['p0'].value_to_code
+        assert len(list(mp.iter_languages())) == 20
+        return size
+
+    # Distinct values, counts and value-to-code mappings are not retained per row - only some
+    # bookkeeping per spilled run:
+    small = retained(4000)
+    small = retained(4000)  # The first measurement includes one-time costs, e.g. of imports.
+    assert retained(16000) < small * 1.3
+
+    # Parameters with many distinct non-numeric values - e.g. forms - are categorical, just like
+    # without memory budget:
+    ds = _values_dataset(tmp_path / 'forms', 4500, numeric=False)
+    for mp in [MultiParameter(ds, ['p0'], memory_budget=10 ** 9),
+               MultiParameter(ds, ['p0'], memory_budget=50000)]:
+        assert mp.parameters['p0'] == MultiParameter(ds, ['p0']).parameters['p0']
+        assert len(mp.parameters['p0'].domain) == len(mp.parameters['p0'].value_to_code) == 1500
+    assert mp.store.spilled
+
+
+def test_MultiParameter_language_properties(StructureDataset):
+    mp = MultiParameter(StructureDataset, [], language_properties=['Family_name', 'Latitude'])
+    assert list(mp.parameters['Family_name'].domain)[-1] == 'Dravidian'
+    assert mp.parameters['Latitude'].type == CONTINUOUS
+    for lang, values in mp.iter_languages():
+        assert values['Latitude'][0].float == pytest.approx(lang.lat)
+        assert values['Family_name'][0].code == 'Family_name'